@@ -0,0 +1,171 @@
+"""Generates metadata for many tables without the UI, resuming from a progress manifest."""
+import argparse
+import fnmatch
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional, Dict, Any
+from database import get_table_names
+from llm import MetadataGenerator
+from cache import MetadataCache
+from rate_limit import rate_limiter
+from checkpoint import CheckpointStore
+from column_store import ColumnStore
+from metadata_catalog import MetadataCatalog
+from config import model_dict, batch_concurrency
+
+
+class ProgressManifest:
+    """JSON file recording the status of every table in a batch run."""
+
+    def __init__(self, path: str):
+        """
+        Loads the manifest, or starts an empty one.
+
+        Args:
+            path (str): Path of the manifest file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self.tables: Dict[str, Dict[str, Any]] = json.load(f)
+        else:
+            self.tables = {}
+
+
+    def is_done(self, table_name: str) -> bool:
+        return self.tables.get(table_name, {}).get('status') == 'done'
+
+
+    def update(self, table_name: str, **entry: Any) -> None:
+        """Records the status of a table and writes the manifest atomically."""
+        with self._lock:
+            self.tables[table_name] = {**entry, 'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.tables, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def select_tables(patterns: Optional[List[str]] = None) -> List[str]:
+    """
+    Selects the tables to process.
+
+    Args:
+        patterns (Optional[List[str]]): Glob patterns matched against table names. All tables when empty.
+
+    Returns:
+        List[str]: Matching table names.
+    """
+    table_names = get_table_names()
+    if not patterns:
+        return table_names
+    return [name for name in table_names if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+
+
+def run(table_names: List[str], model_name: str, output_dir: str, manifest_path: str,
+        workers: int = 4, concurrency: int = batch_concurrency, retry_failed: bool = True,
+        incremental: bool = False, classifier_mode: Optional[str] = None) -> ProgressManifest:
+    """
+    Generates metadata for the tables on a bounded worker pool.
+
+    Tables marked as done in the manifest are skipped, so an interrupted run resumes where it stopped.
+    The metadata of every table is written to `<output_dir>/<table_name>.json`.
+
+    Args:
+        table_names (List[str]): Tables to process.
+        model_name (str): Name of the LLM model, or 'cascade' to start with the fastest model and send uncertain
+            columns to a stronger one.
+        output_dir (str): Folder for the generated metadata.
+        manifest_path (str): Path of the progress manifest.
+        workers (int): Number of tables processed at the same time.
+        concurrency (int): Number of column batches per table sent to the LLM at the same time.
+        retry_failed (bool): Process tables that failed in an earlier run again.
+        incremental (bool): Only generate metadata for columns added or retyped since a table's last run.
+        classifier_mode (Optional[str]): 'hint' or 'override' to run the pattern detectors before generation.
+
+    Returns:
+        ProgressManifest: Manifest with the status of every table.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = ProgressManifest(manifest_path)
+    pending = [
+        name for name in table_names
+        if not manifest.is_done(name) and (retry_failed or manifest.tables.get(name, {}).get('status') != 'failed')
+    ]
+    print(f"{len(table_names) - len(pending)} of {len(table_names)} tables already processed, {len(pending)} to go")
+
+    column_store = ColumnStore()
+    generator = MetadataGenerator(cache=MetadataCache(), rate_limiter=rate_limiter, checkpoints=CheckpointStore(),
+                                  column_store=column_store, metadata_catalog=MetadataCatalog())
+
+    def process(table_name: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        # the same run id on every run, so a table that failed part way resumes after its last completed batch.
+        run_id = f"{table_name}:{model_name}"
+        if model_name == "cascade":
+            response = generator.cascade_metadata(table_name=table_name, concurrency=concurrency, run_id=run_id,
+                                                  incremental=incremental, classifier_mode=classifier_mode)
+        else:
+            response = generator.generate_metadata(table_name=table_name, model_name=model_name, concurrency=concurrency,
+                                                   run_id=run_id, incremental=incremental, classifier_mode=classifier_mode)
+        output_path = os.path.join(output_dir, f"{table_name}.json")
+        with open(output_path, 'w') as f:
+            f.write(response['metadata'].json(indent=2))
+        metrics = response['metrics']
+        result = {
+            'output': output_path, 'cached': response['cached'], 'seconds': round(time.monotonic() - started, 2),
+            'llm_calls': metrics['llm_calls'], 'prompt_tokens': metrics['prompt_tokens'], 'completion_tokens': metrics['completion_tokens']
+        }
+        if response.get('classifier'):
+            result['classifier'] = response['classifier']['detectors']
+        if response.get('cascade'):
+            tiers = response['cascade']['tiers']
+            for key in ('llm_calls', 'prompt_tokens', 'completion_tokens'):
+                result[key] = sum(tier[key] for tier in tiers)
+            result['cascade'] = tiers
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process, name): name for name in pending}
+        for future in as_completed(futures):
+            table_name = futures[future]
+            try:
+                result = future.result()
+                manifest.update(table_name, status='done', model_name=model_name, **result)
+                print(f"done: {table_name} ({result['seconds']}s)")
+            except Exception as e:
+                manifest.update(table_name, status='failed', model_name=model_name, error=str(e))
+                print(f"failed: {table_name}: {e}")
+    stats = column_store.stats()
+    print(f"reused column metadata: {stats['hits']} of {stats['hits'] + stats['misses']} columns ({stats['hit_rate']:.0%})")
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate metadata for many tables.")
+    parser.add_argument("tables", nargs="*", help="glob patterns of tables to process (default: all tables)")
+    parser.add_argument("--model", default="GPT 3.5", help=f"one of {list(model_dict)}, a model version or 'cascade'")
+    parser.add_argument("--output-dir", default="/app/data/metadata")
+    parser.add_argument("--manifest", default="/app/data/metadata/manifest.json")
+    parser.add_argument("--workers", type=int, default=4, help="tables processed at the same time")
+    parser.add_argument("--batch-concurrency", type=int, default=batch_concurrency, help="column batches per table sent at the same time")
+    parser.add_argument("--incremental", action="store_true", help="only describe columns added or retyped since the last run")
+    parser.add_argument("--classifier", choices=["hint", "override"], help="run the pattern detectors and pass their results to the LLM or override its values")
+    parser.add_argument("--skip-failed", action="store_true", help="do not retry tables that failed in an earlier run")
+    args = parser.parse_args(argv)
+    # one JSON record per traced span.
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    model_name = model_dict.get(args.model, args.model)
+    run(select_tables(args.tables), model_name, args.output_dir, args.manifest,
+        workers=args.workers, concurrency=args.batch_concurrency, retry_failed=not args.skip_failed,
+        incremental=args.incremental, classifier_mode=args.classifier)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Offline benchmark of the metadata pipeline, using a fake chat model and a local SQLite database.
+
+Usage:
+    python benchmark.py --columns 10 100 500 2000 --latency 0.2 --json bench.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Any, Optional
+
+# the benchmark database must be configured before `database` creates its engine.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'metadata_benchmark.db')}")
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+from database import engine, catalog
+from fake_llm import FakeChatModel
+from llm import MetadataGenerator
+from llm_clients import LLMClientRegistry
+
+# strategies compared in every scenario: (name, concurrency, context mode).
+strategies = [
+    ("sequential/shared", 1, "shared"),
+    ("sequential/isolated", 1, "isolated"),
+    ("concurrent-8/isolated", 8, "isolated"),
+]
+
+model_name = "fake-model"
+
+
+def create_synthetic_table(columns: int, rows: int = 50, seed: int = 0) -> str:
+    """
+    Creates a table with a mix of numeric, text, date and email columns.
+
+    Args:
+        columns (int): Number of columns.
+        rows (int): Number of rows.
+        seed (int): Seed of the generated values.
+
+    Returns:
+        str: Name of the table.
+    """
+    rng = np.random.default_rng(seed)
+    kinds = ["amount", "label", "created_at", "email", "count"]
+    data = {}
+    for i in range(columns):
+        kind = kinds[i % len(kinds)]
+        name = f"{kind}_{i}"
+        if kind == "amount":
+            data[name] = rng.normal(100, 25, rows).round(2)
+        elif kind == "label":
+            data[name] = rng.choice(["red", "green", "blue", "yellow"], rows)
+        elif kind == "created_at":
+            data[name] = pd.date_range("2024-01-01", periods=rows, freq="h").astype(str)
+        elif kind == "email":
+            data[name] = [f"user{j}@example.com" for j in rng.integers(0, 10000, rows)]
+        else:
+            data[name] = rng.integers(0, 1000, rows)
+    table_name = f"synthetic_{columns}"
+    pd.DataFrame(data).to_sql(table_name, engine, index=False, if_exists="replace")
+    catalog.invalidate()
+    return table_name
+
+
+def run_scenario(table_name: str, strategy: str, concurrency: int, context_mode: str,
+                 latency: float, request_sample_data: bool, max_output_columns: Optional[int],
+                 columns_per_batch: Optional[int]) -> Dict[str, Any]:
+    """Generates metadata for a table once and measures the run."""
+    clients = LLMClientRegistry(settings={model_name: {"max_concurrency": max(concurrency, 1)}})
+    clients.register(model_name, lambda: FakeChatModel(
+        latency=latency, request_sample_data=request_sample_data, max_output_columns=max_output_columns
+    ))
+    generator = MetadataGenerator(clients=clients)
+
+    round_trips = 0
+
+    def count_round_trip(*args: Any) -> None:
+        nonlocal round_trips
+        round_trips += 1
+
+    event.listen(engine, "before_cursor_execute", count_round_trip)
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        response = generator.generate_metadata(table_name=table_name, model_name=model_name,
+                                               concurrency=concurrency, context_mode=context_mode,
+                                               columns_per_batch=columns_per_batch)
+    finally:
+        seconds = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        event.remove(engine, "before_cursor_execute", count_round_trip)
+
+    prompt_tokens: Dict[int, int] = {}
+    for usage in response['token_usage']:
+        prompt_tokens[usage['batch']] = prompt_tokens.get(usage['batch'], 0) + usage['prompt_tokens']
+    per_batch = [prompt_tokens[batch] for batch in sorted(prompt_tokens)]
+    metrics = response['metrics']
+    return {
+        'table': table_name,
+        'columns': len(response['columns']),
+        'strategy': strategy,
+        'seconds': round(seconds, 3),
+        'llm_calls': metrics['llm_calls'],
+        'batches': len(per_batch),
+        'retries': metrics['retries'],
+        'prompt_tokens': sum(per_batch),
+        'prompt_tokens_first_batch': per_batch[0] if per_batch else 0,
+        'prompt_tokens_last_batch': per_batch[-1] if per_batch else 0,
+        'db_round_trips': round_trips,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+        'described_columns': len(response['metadata'].columns) if response.get('metadata') else 0,
+    }
+
+
+def run(column_counts: List[int], latency: float, request_sample_data: bool, max_output_columns: Optional[int],
+        columns_per_batch: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Runs every strategy against a synthetic table of each width.
+
+    A scenario that raises is recorded with its 'error' and the others still run; one that leaves columns
+    undescribed is printed as incomplete.
+    """
+    results = []
+    for columns in column_counts:
+        table_name = create_synthetic_table(columns)
+        for strategy, concurrency, context_mode in strategies:
+            try:
+                result = run_scenario(table_name, strategy, concurrency, context_mode, latency, request_sample_data,
+                                      max_output_columns, columns_per_batch)
+            except Exception as e:
+                result = {'table': table_name, 'columns': columns, 'strategy': strategy, 'error': f"{type(e).__name__}: {e}"}
+                results.append(result)
+                print(f"{columns:>5} cols  {strategy:<22} FAILED: {result['error']}")
+                continue
+            results.append(result)
+            if result['described_columns'] < result['columns']:
+                print(f"{result['columns']:>5} cols  {strategy:<22} INCOMPLETE: {result['described_columns']} columns described")
+            print(
+                f"{result['columns']:>5} cols  {strategy:<22} {result['seconds']:>8.3f}s  "
+                f"calls={result['llm_calls']:<4} batches={result['batches']:<4} retries={result['retries']:<3} "
+                f"prompt_tokens={result['prompt_tokens']:<8} first/last batch={result['prompt_tokens_first_batch']}/{result['prompt_tokens_last_batch']:<7} "
+                f"db={result['db_round_trips']:<4} peak={result['peak_memory_mb']}MB"
+            )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the metadata pipeline offline.")
+    parser.add_argument("--columns", type=int, nargs="+", default=[10, 100, 500, 2000], help="widths of the synthetic tables")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--no-tool-calls", action="store_true", help="never request the get_sample_data tool")
+    parser.add_argument("--max-output-columns", type=int, default=None, help="truncate answers for larger batches")
+    parser.add_argument("--columns-per-batch", type=int, default=None, help="fixed batch size (default: estimated)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.columns, args.latency, not args.no_tool_calls, args.max_output_columns, args.columns_per_batch)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if any('error' in result or result['described_columns'] < result['columns'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Dict, Any, Tuple
+from metadata import DatasetMetadata
+from config import metadata_cache_path, metadata_cache_ttl, metadata_cache_max_entries
+
+
+def fingerprint(value: Any) -> str:
+    """
+    Computes a stable SHA-256 fingerprint of a JSON serializable value.
+
+    Args:
+        value (Any): Value to fingerprint. Values that are not JSON serializable are converted with str().
+
+    Returns:
+        str: Hex digest of the fingerprint.
+    """
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MetadataCache:
+    """Persistent cache of generated DatasetMetadata stored in a local SQLite table."""
+
+    def __init__(self, path: str = metadata_cache_path, ttl: Optional[float] = metadata_cache_ttl,
+                 max_entries: Optional[int] = metadata_cache_max_entries):
+        """
+        Initializes the cache.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            ttl (Optional[float]): Seconds after which an entry expires. None disables expiry.
+            max_entries (Optional[int]): Maximum number of entries kept; least recently used entries are evicted first.
+                None disables size-based eviction.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata_cache (
+                    key TEXT PRIMARY KEY,
+                    table_name TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS metadata_cache_table_name ON metadata_cache (table_name)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(latest_metadata)")]
+            if columns and "options" not in columns:
+                # kept one row per table, regardless of model; incremental runs regenerate from scratch once.
+                conn.execute("DROP TABLE latest_metadata")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS latest_metadata (
+                    table_name TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    column_types TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (table_name, model_name, options)
+                )
+            """)
+
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+
+    def make_key(self, table_name: str, columns: List[str], sample_rows: List[tuple], template_version: str, model_name: str) -> str:
+        """
+        Builds the cache key for a metadata generation run.
+
+        Args:
+            table_name (str): Name of the table.
+            columns (List[str]): Column names of the table.
+            sample_rows (List[tuple]): Sample rows the LLM would analyze.
+            template_version (str): Version of the prompt template.
+            model_name (str): Name of the LLM model.
+
+        Returns:
+            str: Cache key.
+        """
+        return fingerprint({
+            "table_name": table_name,
+            "columns": fingerprint(list(columns)),
+            "sample": fingerprint([list(row) for row in sample_rows]),
+            "template_version": template_version,
+            "model_name": model_name,
+        })
+
+
+    def get(self, key: str) -> Optional[DatasetMetadata]:
+        """
+        Retrieves cached metadata.
+
+        Args:
+            key (str): Cache key from make_key.
+
+        Returns:
+            Optional[DatasetMetadata]: Cached metadata, or None on a miss or an expired entry.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT metadata, created_at FROM metadata_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM metadata_cache WHERE key = ?", (key,))
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE metadata_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return DatasetMetadata.parse_raw(row[0])
+
+
+    def put(self, key: str, table_name: str, model_name: str, metadata: DatasetMetadata) -> None:
+        """
+        Stores metadata and evicts expired and least recently used entries.
+
+        Args:
+            key (str): Cache key from make_key.
+            table_name (str): Name of the table.
+            model_name (str): Name of the LLM model.
+            metadata (DatasetMetadata): Metadata to store.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO metadata_cache (key, table_name, model_name, metadata, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, table_name, model_name, metadata.json(), now, now)
+            )
+            if self.ttl is not None:
+                conn.execute("DELETE FROM metadata_cache WHERE created_at < ?", (now - self.ttl,))
+            if self.max_entries is not None:
+                conn.execute(
+                    "DELETE FROM metadata_cache WHERE key NOT IN (SELECT key FROM metadata_cache ORDER BY accessed_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+
+
+    def save_latest(self, table_name: str, model_name: str, metadata: DatasetMetadata, column_types: Dict[str, str],
+                    options: str) -> None:
+        """
+        Records the most recent metadata of a table with the column types it was generated for.
+        Unlike cache entries, it does not expire; it is the base for incremental regeneration.
+
+        Args:
+            table_name (str): Name of the table.
+            model_name (str): Name of the LLM model.
+            metadata (DatasetMetadata): Metadata of the table.
+            column_types (Dict[str, str]): Data type of each column when the metadata was generated.
+            options (str): Prompt version and run options the metadata was generated with.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO latest_metadata (table_name, model_name, options, metadata, column_types, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (table_name, model_name, options, metadata.json(), json.dumps(column_types), time.time())
+            )
+
+
+    def load_latest(self, table_name: str, model_name: str, options: str) -> Optional[Tuple[DatasetMetadata, Dict[str, str]]]:
+        """
+        Loads the most recent metadata of a table generated by a model with the given options.
+
+        Args:
+            table_name (str): Name of the table.
+            model_name (str): Name of the LLM model.
+            options (str): Prompt version and run options, as passed to save_latest.
+
+        Returns:
+            Optional[Tuple[DatasetMetadata, Dict[str, str]]]: Metadata and the column types it was generated for,
+                or None if the table has no metadata stored for this model and these options.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT metadata, column_types FROM latest_metadata WHERE table_name = ? AND model_name = ? AND options = ?",
+                (table_name, model_name, options)
+            ).fetchone()
+        if not row:
+            return None
+        return DatasetMetadata.parse_raw(row[0]), json.loads(row[1])
+
+
+    def invalidate(self, table_name: Optional[str] = None) -> int:
+        """
+        Removes cached entries and the latest metadata, so that the next run regenerates every column.
+
+        Args:
+            table_name (Optional[str]): Table whose entries are removed. None removes every entry.
+
+        Returns:
+            int: Number of cache entries removed.
+        """
+        with self._lock, self._connect() as conn:
+            if table_name is None:
+                cursor = conn.execute("DELETE FROM metadata_cache")
+                conn.execute("DELETE FROM latest_metadata")
+            else:
+                cursor = conn.execute("DELETE FROM metadata_cache WHERE table_name = ?", (table_name,))
+                conn.execute("DELETE FROM latest_metadata WHERE table_name = ?", (table_name,))
+            return cursor.rowcount
+
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reports cache counters.
+
+        Returns:
+            Dict[str, int]: Hits and misses since the cache was created, and the number of stored entries.
+        """
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM metadata_cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -0,0 +1,134 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+from metadata import DatasetMetadata
+from config import checkpoint_path, checkpoint_max_age
+
+
+class CheckpointStore:
+    """Local SQLite store of the metadata generated so far by each run, saved after every column batch."""
+
+    def __init__(self, path: str = checkpoint_path, max_age: Optional[float] = checkpoint_max_age):
+        """
+        Initializes the store and removes checkpoints older than `max_age`.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            max_age (Optional[float]): Seconds after which an unfinished run's checkpoint is removed. None keeps them.
+        """
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(checkpoints)")]
+            if columns and "options" not in columns:
+                # checkpoints without run options cannot be checked against the run that resumes them.
+                conn.execute("DROP TABLE checkpoints")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    run_id TEXT PRIMARY KEY,
+                    table_name TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    column_types TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    batches INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+        self.gc()
+
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+
+    def load(self, run_id: str, model_name: str, options: str, column_types: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        """
+        Loads the checkpoint of a run, if it was saved by the same model and options for the same columns.
+        A checkpoint saved otherwise is removed, as its batches do not belong to this run.
+
+        Args:
+            run_id (str): Identifier of the run.
+            model_name (str): Name of the LLM model.
+            options (str): Prompt version and run options of the run.
+            column_types (Dict[str, str]): Current data type of each column of the table.
+
+        Returns:
+            Optional[Dict[str, Any]]: 'metadata' generated so far, the 'processed_columns' it covers and the
+                number of completed 'batches', or None if the run has no matching checkpoint.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT metadata, batches, model_name, options, column_types FROM checkpoints WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        if not row:
+            return None
+        if (row[2], row[3], json.loads(row[4])) != (model_name, options, column_types):
+            self.delete(run_id)
+            return None
+        metadata = DatasetMetadata.parse_raw(row[0])
+        return {
+            'metadata': metadata,
+            'processed_columns': {column.name for column in metadata.columns},
+            'batches': row[1]
+        }
+
+
+    def save_batch(self, run_id: str, table_name: str, model_name: str, metadata: DatasetMetadata,
+                   options: str, column_types: Dict[str, str]) -> None:
+        """
+        Adds the metadata of a completed batch to the run's checkpoint.
+        A checkpoint saved by another model, other options or for other column types is replaced.
+
+        Args:
+            run_id (str): Identifier of the run.
+            table_name (str): Name of the table.
+            model_name (str): Name of the LLM model.
+            metadata (DatasetMetadata): Metadata of the batch.
+            options (str): Prompt version and run options of the run.
+            column_types (Dict[str, str]): Data type of each column of the table when the run started.
+        """
+        types = json.dumps(column_types, sort_keys=True)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT metadata, batches FROM checkpoints WHERE run_id = ? AND model_name = ? AND options = ? AND column_types = ?",
+                (run_id, model_name, options, types)
+            ).fetchone()
+            batches = 1
+            if row:
+                saved = DatasetMetadata.parse_raw(row[0])
+                names = {column.name for column in metadata.columns}
+                metadata = DatasetMetadata(
+                    name=saved.name,
+                    description=saved.description,
+                    columns=[column for column in saved.columns if column.name not in names] + metadata.columns
+                )
+                batches = row[1] + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, table_name, model_name, options, column_types, metadata, batches, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, table_name, model_name, options, types, metadata.json(), batches, time.time())
+            )
+
+
+    def delete(self, run_id: str) -> None:
+        """Removes the checkpoint of a run."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+
+
+    def gc(self) -> int:
+        """
+        Removes checkpoints older than `max_age`.
+
+        Returns:
+            int: Number of checkpoints removed.
+        """
+        if self.max_age is None:
+            return 0
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (time.time() - self.max_age,))
+            return cursor.rowcount
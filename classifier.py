@@ -0,0 +1,147 @@
+import re
+import time
+from typing import Dict, Any, List, Tuple
+import numpy as np
+import pandas as pd
+from config import classifier_min_match_rate, classifier_min_values
+
+# detectors run over the sample values of each column. A column is assigned a detector's data type, tags and
+# sensitivity when at least `classifier_min_match_rate` of its non-null values fully match the pattern and,
+# for detectors with a name hint, the column name matches it.
+detectors = {
+    "email": {
+        "pattern": r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+        "data_type": "string", "tags": ["PII"], "sensitivity": "PII",
+    },
+    "phone": {
+        "pattern": r"(?:\+\d{1,3}[\s.-]?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}",
+        "name_hint": r"phone|mobile|cell|fax|tel",
+        "data_type": "string", "tags": ["PII"], "sensitivity": "PII",
+    },
+    "card_number": {
+        "pattern": r"\d{4}(?:[ -]?\d{4}){2}[ -]?\d{1,7}",
+        "luhn": True,
+        "data_type": "string", "tags": ["Financial", "PII"], "sensitivity": "PII",
+    },
+    "zip_code": {
+        "pattern": r"\d{5}(?:-\d{4})?",
+        "name_hint": r"zip|postal",
+        "data_type": "string", "tags": ["Geospatial"], "sensitivity": "not sensitive",
+    },
+    "timestamp": {
+        "pattern": r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?",
+        "data_type": "datetime", "tags": ["Temporal"], "sensitivity": "not sensitive",
+    },
+    "date": {
+        "pattern": r"\d{4}-\d{2}-\d{2}",
+        "data_type": "date", "tags": ["Temporal"], "sensitivity": "not sensitive",
+    },
+    "latitude": {
+        "range": (-90, 90),
+        "name_hint": r"(?:^|_)lat(?:itude)?(?:$|_)",
+        "data_type": "double/float", "tags": ["Geospatial"], "sensitivity": "not sensitive",
+    },
+    "longitude": {
+        "range": (-180, 180),
+        "name_hint": r"(?:^|_)(?:lon|lng|long|longitude)(?:$|_)",
+        "data_type": "double/float", "tags": ["Geospatial"], "sensitivity": "not sensitive",
+    },
+}
+
+
+def _luhn_valid(values: pd.Series) -> pd.Series:
+    """Checks the Luhn checksum of card numbers, for all values at once."""
+    digits = values.str.replace(r"\D", "", regex=True)
+    width = int(digits.str.len().max())
+    padded = digits.str.zfill(width)
+    matrix = (np.frombuffer("".join(padded).encode("ascii"), dtype=np.uint8).reshape(-1, width) - ord("0")).astype(np.int64)
+    # double every second digit from the right; leading zero padding does not change the checksum.
+    reversed_digits = matrix[:, ::-1]
+    reversed_digits[:, 1::2] *= 2
+    reversed_digits[reversed_digits > 9] -= 9
+    return pd.Series(reversed_digits.sum(axis=1) % 10 == 0, index=values.index)
+
+
+def _match_rate(detector: Dict[str, Any], values: pd.Series) -> float:
+    """Fraction of the non-null values that the detector matches."""
+    if "range" in detector:
+        numbers = pd.to_numeric(values, errors="coerce")
+        low, high = detector["range"]
+        return float(numbers.between(low, high).mean())
+    text = values.astype(str).str.strip()
+    matches = text.str.fullmatch(detector["pattern"])
+    if detector.get("luhn") and matches.any():
+        matches = matches & _luhn_valid(text.where(matches, "0"))
+    return float(matches.mean())
+
+
+def classify_columns(sample: pd.DataFrame) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Assigns data type, tags and sensitivity to the columns whose sample values a detector matches confidently.
+
+    Args:
+        sample (pd.DataFrame): Sample rows of the columns to classify.
+
+    Returns:
+        Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]: Hints by column name, with the 'detector',
+            'data_type', 'tags', 'sensitivity' and 'match_rate'; and for every detector, the 'seconds' spent,
+            the number of 'columns' checked and of 'matches'.
+    """
+    hints: Dict[str, Dict[str, Any]] = {}
+    stats = {name: {"seconds": 0.0, "columns": 0, "matches": 0} for name in detectors}
+    for column in sample.columns:
+        values = sample[column].dropna()
+        if len(values) < classifier_min_values:
+            continue
+        for name, detector in detectors.items():
+            if column in hints:
+                break
+            hint = detector.get("name_hint")
+            if hint and not re.search(hint, str(column).lower()):
+                continue
+            start = time.perf_counter()
+            rate = _match_rate(detector, values)
+            stats[name]["seconds"] += time.perf_counter() - start
+            stats[name]["columns"] += 1
+            if rate >= classifier_min_match_rate:
+                stats[name]["matches"] += 1
+                hints[column] = {
+                    "detector": name,
+                    "data_type": detector["data_type"],
+                    "tags": list(detector["tags"]),
+                    "sensitivity": detector["sensitivity"],
+                    "match_rate": round(rate, 3),
+                }
+    for entry in stats.values():
+        entry["seconds"] = round(entry["seconds"], 6)
+    return hints, stats
+
+
+def format_hints(hints: Dict[str, Dict[str, Any]], columns: List[str]) -> str:
+    """Describes the hints of the given columns for a prompt, or returns an empty string when there are none."""
+    lines = [
+        f"- {column}: data_type={hints[column]['data_type']}, tags={hints[column]['tags']}, sensitivity={hints[column]['sensitivity']}"
+        for column in columns if column in hints
+    ]
+    if not lines:
+        return ""
+    return "Pattern detection on the sample values found the following; use them for these columns:\n" + "\n".join(lines) + "\n"
+
+
+def detector_precision(stats: Dict[str, Dict[str, Any]], checks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Adds to the detector stats the share of their hints that the LLM agreed with.
+
+    Args:
+        stats (Dict[str, Dict[str, Any]]): Detector stats from classify_columns.
+        checks (List[Dict[str, Any]]): One entry per hinted column the LLM described, with the 'detector' and
+            whether the LLM 'agreed'.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Detector stats with 'precision' - None for detectors without checks.
+    """
+    result = {}
+    for name, entry in stats.items():
+        agreed = [check["agreed"] for check in checks if check["detector"] == name]
+        result[name] = {**entry, "precision": round(sum(agreed) / len(agreed), 3) if agreed else None}
+    return result
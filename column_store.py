@@ -0,0 +1,176 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+import pandas as pd
+from metadata import ColumnMetadata
+from config import column_store_path, column_reuse_threshold
+
+# number of smallest value hashes kept per column (bottom-k sketch) and number of value patterns kept.
+sketch_size = 64
+max_patterns = 16
+# weight of value overlap vs. pattern overlap in the similarity; values of columns such as ids or timestamps
+# rarely overlap across tables, so their shape counts for more.
+value_weight = 0.3
+
+
+def normalize_name(name: str) -> str:
+    """Normalizes a column name: lowercase words separated by single underscores."""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", name)
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def value_pattern(value: Any) -> str:
+    """Reduces a value to its shape: runs of letters become 'a', runs of digits '9', other characters are kept."""
+    return re.sub(r"\d+", "9", re.sub(r"[^\W\d_]+", "a", str(value)))
+
+
+def _hash(value: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def column_signature(name: str, sql_type: str, values: pd.Series) -> Dict[str, Any]:
+    """
+    Computes the signature of a column.
+
+    Args:
+        name (str): Name of the column.
+        sql_type (str): SQL data type of the column.
+        values (pd.Series): Sample values of the column.
+
+    Returns:
+        Dict[str, Any]: Normalized 'name' and 'sql_type', the smallest hashes of the distinct values ('value_hashes')
+            and the most common value shapes ('patterns').
+    """
+    distinct = values.dropna().astype(str).drop_duplicates()
+    return {
+        'name': normalize_name(name),
+        'sql_type': sql_type.lower(),
+        'value_hashes': sorted(_hash(value) for value in distinct)[:sketch_size],
+        'patterns': distinct.map(value_pattern).value_counts().head(max_patterns).index.tolist(),
+    }
+
+
+def similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """
+    Estimates how similar two column signatures with the same name and type are, from 0 to 1.
+
+    Combines the Jaccard similarity of the distinct values, estimated from the bottom-k hash sketches,
+    with the Jaccard similarity of the value patterns.
+    """
+    hashes_a, hashes_b = set(a['value_hashes']), set(b['value_hashes'])
+    union = sorted(hashes_a | hashes_b)[:sketch_size]
+    values = sum(1 for h in union if h in hashes_a and h in hashes_b) / len(union) if union else 1.0
+    patterns_a, patterns_b = set(a['patterns']), set(b['patterns'])
+    patterns = len(patterns_a & patterns_b) / len(patterns_a | patterns_b) if patterns_a | patterns_b else 1.0
+    return value_weight * values + (1 - value_weight) * patterns
+
+
+class ColumnStore:
+    """Local SQLite store of generated column metadata, looked up by column signature across tables."""
+
+    def __init__(self, path: str = column_store_path, threshold: float = column_reuse_threshold):
+        """
+        Initializes the store.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            threshold (float): Minimum similarity for stored metadata to be reused.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(column_metadata)")]
+            if columns and "options" not in columns:
+                # entries without their model and options could be reused by runs with any model.
+                conn.execute("DROP TABLE column_metadata")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS column_metadata (
+                    name TEXT NOT NULL,
+                    sql_type TEXT NOT NULL,
+                    source_table TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (name, sql_type, source_table, model_name, options)
+                )
+            """)
+
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+
+    def find(self, signature: Dict[str, Any], model_name: str, options: str,
+             exclude_table: Optional[str] = None) -> Optional[ColumnMetadata]:
+        """
+        Finds stored metadata for a column with the same normalized name and type and similar values,
+        generated by the same model with the same prompt and options.
+
+        Args:
+            signature (Dict[str, Any]): Signature from column_signature.
+            model_name (str): Name of the LLM model of the run.
+            options (str): Prompt version and run options of the run.
+            exclude_table (Optional[str]): Table whose own entries are ignored.
+
+        Returns:
+            Optional[ColumnMetadata]: Metadata of the most similar stored column at or above the threshold, or None.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT signature, metadata FROM column_metadata "
+                "WHERE name = ? AND sql_type = ? AND model_name = ? AND options = ? AND source_table != ?",
+                (signature['name'], signature['sql_type'], model_name, options, exclude_table or "")
+            ).fetchall()
+        best, best_score = None, self.threshold
+        for stored_signature, metadata in rows:
+            score = similarity(signature, json.loads(stored_signature))
+            if score >= best_score:
+                best, best_score = metadata, score
+        with self._lock:
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return ColumnMetadata.parse_raw(best)
+
+
+    def add(self, signature: Dict[str, Any], metadata: ColumnMetadata, source_table: str, model_name: str, options: str) -> None:
+        """
+        Stores the metadata of a column.
+
+        Args:
+            signature (Dict[str, Any]): Signature from column_signature.
+            metadata (ColumnMetadata): Generated metadata of the column.
+            source_table (str): Table the column belongs to.
+            model_name (str): Name of the LLM model that generated the metadata.
+            options (str): Prompt version and run options it was generated with.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO column_metadata (name, sql_type, source_table, model_name, options, signature, metadata, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (signature['name'], signature['sql_type'], source_table, model_name, options, json.dumps(signature),
+                 metadata.json(), time.time())
+            )
+
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports lookup counters.
+
+        Returns:
+            Dict[str, Any]: Hits and misses since the store was created, the hit rate and the number of stored columns.
+        """
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM column_metadata").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": entries}
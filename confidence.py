@@ -0,0 +1,76 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+from metadata import ColumnMetadata
+from config import color_map
+
+# values the output schema asks for; anything else means the model did not follow it.
+data_types = {"int", "integer", "bigint", "double", "float", "double/float", "decimal", "numeric", "string", "text",
+              "varchar", "date", "datetime", "timestamp", "boolean", "bool"}
+sensitivities = {"pii", "phi", "not sensitive"}
+tags = set(color_map)
+
+# weights of the schema, heuristic agreement and description checks in the confidence score.
+weights = {"schema": 0.4, "agreement": 0.3, "description": 0.3}
+min_description_length = 40
+# an invalid schema value, a disagreement with a detector or a description failing every check caps the score
+# here, below the cascade threshold, so any one of them alone escalates the column.
+failed_check_cap = 0.5
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).strip()
+
+
+def column_confidence(column: ColumnMetadata, hint: Optional[Dict[str, Any]] = None) -> Tuple[float, List[str]]:
+    """
+    Scores how far the generated metadata of a column can be trusted, without another LLM call.
+
+    Args:
+        column (ColumnMetadata): Generated metadata of the column.
+        hint (Optional[Dict[str, Any]]): Pattern detection hint of the column from classifier.classify_columns, if any.
+
+    Returns:
+        Tuple[float, List[str]]: Score between 0 and 1, and the reasons it is lower than 1. The score is at most
+            failed_check_cap when a data type, sensitivity or tag is invalid, a detector disagrees or the
+            description fails every check.
+    """
+    reasons = []
+    schema_checks = [
+        (column.data_type or "").strip().lower() in data_types,
+        (column.sensitivity or "").strip().lower() in sensitivities,
+        all(tag in tags for tag in column.tags or []),
+    ]
+    if not schema_checks[0]:
+        reasons.append(f"unknown data type '{column.data_type}'")
+    if not schema_checks[1]:
+        reasons.append(f"unknown sensitivity '{column.sensitivity}'")
+    if not schema_checks[2]:
+        reasons.append(f"unknown tags {[tag for tag in column.tags if tag not in tags]}")
+    schema = sum(schema_checks) / len(schema_checks)
+
+    agreement = 1.0
+    if hint:
+        agreement_checks = [
+            set(hint['tags']) <= set(column.tags or []),
+            (column.sensitivity or "").strip().lower() == hint['sensitivity'].lower(),
+        ]
+        agreement = sum(agreement_checks) / len(agreement_checks)
+        if agreement < 1:
+            reasons.append(f"disagrees with the {hint['detector']} detector")
+
+    description = _normalize(column.description)
+    description_checks = [
+        len(description) >= min_description_length,
+        description != _normalize(column.name),
+        bool((column.analysis or "").strip()),
+    ]
+    if not description_checks[0] or not description_checks[1]:
+        reasons.append("description too short")
+    if not description_checks[2]:
+        reasons.append("no analysis")
+    description_score = sum(description_checks) / len(description_checks)
+
+    score = weights["schema"] * schema + weights["agreement"] * agreement + weights["description"] * description_score
+    if schema < 1 or agreement < 1 or description_score == 0:
+        score = min(score, failed_check_cap)
+    return round(score, 3), reasons
@@ -1,4 +1,5 @@
 """Dictionary of models to map friendly names of LLMs to the specific versions"""
+import os
 
 model_dict = {
     "GPT 3.5": "gpt-3.5-turbo-0125",
@@ -22,4 +23,86 @@ color_map = {
     "Demographic": "#FF8B00",  # Orange
     "Metadata": "#00B8D9",  # Blue
     "Other": "#ABB8C3"  # Gray
-}
\ No newline at end of file
+}
+
+
+# Maximum number of column batches sent to the LLM in parallel for a single table.
+batch_concurrency = 4
+
+
+# Persistent cache of generated metadata (SQLite file), entry lifetime in seconds and maximum number of entries.
+metadata_cache_path = os.environ.get("METADATA_CACHE_PATH", "/app/data/metadata_cache.db")
+metadata_cache_ttl = 7 * 24 * 3600
+metadata_cache_max_entries = 1000
+
+# Seconds before the cached list of tables and columns is reloaded from the database. Tables created or altered by
+# the application invalidate it immediately; other schema changes are seen after this delay.
+schema_catalog_ttl = 300
+
+# Request and token budgets per minute for each model, shared by all generators in a process.
+model_rate_limits = {
+    "gpt-3.5-turbo-0125": {"requests_per_minute": 500, "tokens_per_minute": 160000},
+    "gpt-4-turbo-preview": {"requests_per_minute": 500, "tokens_per_minute": 30000},
+    "gpt-4o-2024-05-13": {"requests_per_minute": 500, "tokens_per_minute": 30000},
+}
+
+# Checkpoints of unfinished generation runs (SQLite file) and seconds after which they are removed.
+checkpoint_path = os.environ.get("CHECKPOINT_PATH", "/app/data/checkpoints.db")
+checkpoint_max_age = 3 * 24 * 3600
+
+# LLM client settings: calls in flight per model, request timeout in seconds and retries on 429/5xx responses.
+llm_client_defaults = {"max_concurrency": 8, "timeout": 120, "max_retries": 6}
+llm_client_settings = {
+    "gpt-4-turbo-preview": {"timeout": 300},
+    "gpt-4o-2024-05-13": {"timeout": 180},
+}
+
+# Context window and output token limit of each model, used to size column batches.
+model_limits = {
+    "gpt-3.5-turbo-0125": {"context_window": 16385, "max_output_tokens": 4096},
+    "gpt-4-turbo-preview": {"context_window": 128000, "max_output_tokens": 4096},
+    "gpt-4o-2024-05-13": {"context_window": 128000, "max_output_tokens": 4096},
+}
+default_model_limits = {"context_window": 8192, "max_output_tokens": 2048}
+max_columns_per_batch = 50
+
+# Tool rounds a column batch may take in sequential mode before the run is stopped.
+max_tool_rounds = 3
+
+# Times the columns an answer left out are requested again, before the run fails.
+max_missing_column_rounds = 2
+
+# Seconds the UI keeps the table list and each table's sample data before reloading them.
+ui_table_names_ttl = 300
+ui_sample_data_ttl = 600
+
+# Sample data sent to the LLM: rows (or distinct values per column), sampling strategy ('head', 'random' or
+# 'distinct'), maximum length of text values, how many rows to scan per value for the 'distinct' strategy, and
+# how many leading rows a random sample is drawn from where TABLESAMPLE is unavailable or returns too few rows.
+sample_rows = 3
+sample_strategy = "distinct"
+sample_max_value_length = 100
+distinct_scan_factor = 20
+sample_scan_limit = 10000
+
+# Column metadata reused across tables (SQLite file) and minimum signature similarity for reuse.
+column_store_path = os.environ.get("COLUMN_STORE_PATH", "/app/data/column_store.db")
+column_reuse_threshold = 0.6
+
+# Rows sampled to profile columns before generation - for column signatures and pattern detection.
+profile_sample_rows = 100
+
+# Pattern detection: share of a column's sample values a detector must match, and minimum non-null values.
+classifier_min_match_rate = 0.9
+classifier_min_values = 5
+
+# Tool calls of one model turn executed at the same time.
+tool_max_workers = 8
+
+# Columns per page of metadata catalog search results.
+catalog_page_size = 50
+
+# Cascade: models tried in order, cheapest first. Columns scoring below the confidence threshold are sent
+# again to the next model. Keep the threshold above confidence.failed_check_cap, which failed checks cap the score at.
+cascade_models = [model_dict["GPT 3.5"], model_dict["GPT 4o"]]
+cascade_confidence_threshold = 0.7
@@ -1,15 +1,29 @@
 import os
+import io
+import json
+import hashlib
+import threading
+import time
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy import create_engine, text, inspect
-from typing import List
+from sqlalchemy.engine import Engine
+from typing import List, Dict, Optional, Tuple
+from config import schema_catalog_ttl, distinct_scan_factor, sample_scan_limit
 
 def create_database_engine():
     """
     Creates a connection to the database using SQLAlchemy.
 
+    DATABASE_URL, when set, overrides the Postgres container settings - for example a local SQLite file.
+
     Returns:
         Engine: SQLAlchemy engine object for database connection.
     """
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        return create_engine(url)
     host = 'postgres'
     user = os.environ.get('POSTGRES_USER')
     password = os.environ.get('POSTGRES_PASSWORD')
@@ -21,30 +35,253 @@ def create_database_engine():
 # engine  - used in all functions.
 engine = create_database_engine()
 
+# tables used by the application itself - not shown as datasets.
+internal_tables = {"load_manifest", "metadata_datasets", "metadata_columns"}
 
-def load_data() -> None:
-    """Loads data from CSV files into the database."""
-    data_folder = "/app/data/datasets"
 
-    for file in os.listdir(data_folder):
-        if file.endswith(".csv"):
-            table_name = os.path.splitext(file)[0].lower().replace('-', '_')
-            print(f"processing {table_name} ...")
+class SchemaCatalog:
+    """
+    In-memory cache of the tables and columns in the database, loaded with one information_schema query.
 
-            file_path = os.path.join(data_folder, file)
-            print(f"file_path: {file_path}")
+    It is reloaded when older than its TTL, or on the next lookup after invalidate(), which code that creates or
+    alters tables calls.
+    """
+
+    query = text("""
+        SELECT c.table_name, c.column_name, c.data_type
+        FROM information_schema.columns c
+        JOIN information_schema.tables t
+          ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+        WHERE c.table_schema = current_schema() AND t.table_type = 'BASE TABLE'
+        ORDER BY c.table_name, c.ordinal_position
+    """)
+
+    def __init__(self, engine: Engine, ttl: Optional[float] = schema_catalog_ttl):
+        """
+        Initializes the catalog.
+
+        Args:
+            engine (Engine): SQLAlchemy engine of the database.
+            ttl (Optional[float]): Seconds after which the catalog is reloaded. None keeps it until invalidated.
+        """
+        self.engine = engine
+        self.ttl = ttl
+        self._tables: Dict[str, List[Tuple[str, str]]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+
+    def _load(self) -> None:
+        """Reflects all tables and columns, in a single round trip on Postgres."""
+        tables: Dict[str, List[Tuple[str, str]]] = {}
+        if self.engine.dialect.name == 'postgresql':
+            with self.engine.connect() as conn:
+                rows = conn.execute(self.query).fetchall()
+        else:
+            # databases without information_schema, such as SQLite, are reflected table by table.
+            inspector = inspect(self.engine)
+            rows = [
+                (table_name, column['name'], str(column['type']))
+                for table_name in inspector.get_table_names()
+                for column in inspector.get_columns(table_name)
+            ]
+        for table_name, column_name, data_type in rows:
+            if table_name in internal_tables:
+                continue
+            tables.setdefault(table_name, []).append((column_name, data_type))
+        self._tables = tables
+        self._loaded_at = time.monotonic()
+
+
+    def _snapshot(self, refresh: bool = False) -> Dict[str, List[Tuple[str, str]]]:
+        """Returns the cached tables, reloading them when stale or when a refresh is requested."""
+        with self._lock:
+            expired = self.ttl is not None and self._loaded_at is not None and time.monotonic() - self._loaded_at > self.ttl
+            if refresh or expired or self._loaded_at is None:
+                self._load()
+            return self._tables
+
+
+    def invalidate(self) -> None:
+        """Discards the cached tables so that the next lookup reloads them."""
+        with self._lock:
+            self._loaded_at = None
+
+
+    def table_names(self) -> List[str]:
+        """Returns the names of all tables."""
+        return sorted(self._snapshot())
+
+
+    def columns(self, table_name: str) -> List[Tuple[str, str]]:
+        """
+        Returns the columns of a table.
+
+        Args:
+            table_name (str): Name of the table.
+
+        Returns:
+            List[Tuple[str, str]]: Column names and data types, in table order.
+
+        Raises:
+            ValueError: If the table does not exist.
+        """
+        tables = self._snapshot()
+        if table_name not in tables:
+            # the table may have been created after the catalog was loaded.
+            tables = self._snapshot(refresh=True)
+        if table_name not in tables:
+            raise ValueError(f"Table '{table_name}' does not exist")
+        return tables[table_name]
+
+
+# catalog - serves table and column lookups.
+catalog = SchemaCatalog(engine)
+
+
+manifest_ddl = """
+    CREATE TABLE IF NOT EXISTS load_manifest (
+        file_name TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        row_limit INTEGER NOT NULL,
+        sampling TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        loaded_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+
+def _file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """Computes the SHA-256 hash of a file, reading it in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sample_csv(file_path: str, row_limit: int, sampling: str, chunk_size: int, seed: int) -> pd.DataFrame:
+    """
+    Reads at most `row_limit` rows of a CSV file without holding the whole file in memory.
+
+    Args:
+        file_path (str): Path of the CSV file.
+        row_limit (int): Maximum number of rows to keep.
+        sampling (str): 'head' keeps the first rows; 'random' keeps a uniform random sample of the whole file.
+        chunk_size (int): Number of rows read at a time when sampling randomly.
+        seed (int): Seed of the random sample, so that reloading the same file gives the same rows.
+
+    Returns:
+        pd.DataFrame: Sampled rows, in file order.
+    """
+    if sampling == "head":
+        return pd.read_csv(file_path, nrows=row_limit)
+
+    # keep the rows with the `row_limit` smallest random keys seen so far - a uniform sample of the file.
+    rng = np.random.default_rng(seed)
+    sample = None
+    for chunk in pd.read_csv(file_path, chunksize=chunk_size):
+        chunk["_sample_key"] = rng.random(len(chunk))
+        sample = chunk if sample is None else pd.concat([sample, chunk])
+        sample = sample.nsmallest(row_limit, "_sample_key")
+    return sample.sort_index().drop(columns="_sample_key").reset_index(drop=True)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _load_file(file_path: str, table_name: str, row_limit: int, sampling: str, chunk_size: int, seed: int, force: bool) -> str:
+    """Loads one CSV file into a table with COPY, unless the manifest shows it is already loaded."""
+    file_name = os.path.basename(file_path)
+    content_hash = _file_hash(file_path)
+    if not force:
+        with engine.connect() as conn:
+            loaded = conn.execute(
+                text("SELECT content_hash, row_limit, sampling FROM load_manifest WHERE file_name = :file_name"),
+                {"file_name": file_name}
+            ).fetchone()
+            exists = conn.execute(text("SELECT to_regclass(:table_name)"), {"table_name": table_name}).scalar()
+        if exists and loaded and tuple(loaded) == (content_hash, row_limit, sampling):
+            return f"Skipped {table_name}: {file_name} is unchanged"
+
+    df = _sample_csv(file_path, row_limit, sampling, chunk_size, seed)
+    create_table = pd.io.sql.get_schema(df, table_name, con=engine)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(_quote(column) for column in df.columns)
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        cursor.execute(create_table)
+        cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            """
+            INSERT INTO load_manifest (file_name, table_name, content_hash, row_limit, sampling, row_count, loaded_at)
+            VALUES (%s, %s, %s, %s, %s, %s, now())
+            ON CONFLICT (file_name) DO UPDATE SET
+                table_name = EXCLUDED.table_name, content_hash = EXCLUDED.content_hash, row_limit = EXCLUDED.row_limit,
+                sampling = EXCLUDED.sampling, row_count = EXCLUDED.row_count, loaded_at = EXCLUDED.loaded_at
+            """,
+            (file_name, table_name, content_hash, row_limit, sampling, len(df))
+        )
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return f"Loaded {len(df)} rows into table: {table_name}"
+
+
+def load_data(data_folder: str = "/app/data/datasets", row_limit: int = 10000, sampling: str = "head",
+              max_workers: int = 4, chunk_size: int = 100000, seed: int = 0, force: bool = False) -> None:
+    """
+    Loads data from CSV files into the database.
+
+    Files are sampled while streaming, written with COPY and loaded in parallel. A file whose content
+    hash and sampling options match the load manifest is skipped.
 
-            df = pd.read_csv(file_path)
+    Args:
+        data_folder (str): Folder containing the CSV files.
+        row_limit (int): Maximum number of rows loaded per file.
+        sampling (str): 'head' loads the first rows of each file; 'random' loads a uniform random sample.
+        max_workers (int): Number of files loaded at the same time.
+        chunk_size (int): Number of rows read at a time when sampling randomly.
+        seed (int): Seed of the random sample.
+        force (bool): Reload every file, even if it is unchanged.
+
+    Raises:
+        ValueError: If the sampling strategy is unknown.
+    """
+    if sampling not in ("head", "random"):
+        raise ValueError(f"Unknown sampling strategy '{sampling}'. Use 'head' or 'random'.")
 
-            with engine.connect() as conn:
-                conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
-                conn.commit()
+    with engine.connect() as conn:
+        conn.execute(text(manifest_ddl))
+        conn.commit()
 
-            df.head(10000).to_sql(table_name, engine, index=False)
+    jobs = []
+    for file in sorted(os.listdir(data_folder)):
+        if file.endswith(".csv"):
+            table_name = os.path.splitext(file)[0].lower().replace('-', '_')
+            file_path = os.path.join(data_folder, file)
+            jobs.append((file_path, table_name))
 
-            print(f"Loaded data into table: {table_name}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_load_file, file_path, table_name, row_limit, sampling, chunk_size, seed, force): file_path
+            for file_path, table_name in jobs
+        }
+        for future in as_completed(futures):
+            print(f"file_path: {futures[future]}")
+            print(future.result())
             print()
 
+    catalog.invalidate()
+
 
 def get_table_names() -> List[str]:
     """
@@ -53,8 +290,7 @@ def get_table_names() -> List[str]:
     Returns:
         List[str]: List of table names.
     """
-    inspector = inspect(engine)
-    return inspector.get_table_names()
+    return catalog.table_names()
 
 
 def get_column_names(table_name: str) -> List[str]:
@@ -67,9 +303,20 @@ def get_column_names(table_name: str) -> List[str]:
     Returns:
         List[str]: List of column names.
     """
-    inspector = inspect(engine)
-    columns = inspector.get_columns(table_name)
-    return [column['name'] for column in columns]
+    return [name for name, _ in catalog.columns(table_name)]
+
+
+def get_column_types(table_name: str) -> Dict[str, str]:
+    """
+    Retrieves the data types of the columns of a table.
+
+    Args:
+        table_name (str): Name of the table.
+
+    Returns:
+        Dict[str, str]: Data type of each column, by column name.
+    """
+    return dict(catalog.columns(table_name))
 
 
 def get_sample_data(table_name: str) -> List[tuple]:
@@ -91,4 +338,103 @@ def get_sample_data(table_name: str) -> List[tuple]:
         return sample_data
     except Exception as e:
         raise ValueError(f"Failed to retrieve sample data for table '{table_name}': {str(e)}")
-    
\ No newline at end of file
+    
+
+
+def _random_sample_query(select: str, table_name: str, limit: int, conn) -> str:
+    """
+    Builds a query for a random sample: TABLESAMPLE SYSTEM on Postgres, sized from the planner's row estimate,
+    which reads only the sampled pages. Elsewhere, see _bounded_random_query.
+    """
+    if engine.dialect.name != 'postgresql':
+        return _bounded_random_query(select, table_name, limit)
+    rows = conn.execute(text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table_name)"), {"table_name": table_name}).scalar()
+    # ask for about 5x the rows needed, so that LIMIT usually has enough to choose from.
+    percent = 100.0 if not rows or rows <= 0 else min(100.0, max(0.001, 500.0 * limit / rows))
+    return f"SELECT {select} FROM {table_name} TABLESAMPLE SYSTEM ({percent}) LIMIT {limit}"
+
+
+def _bounded_random_query(select: str, table_name: str, limit: int) -> str:
+    """Builds a query for random rows among the first sample_scan_limit rows, so that large tables are not fully scanned."""
+    return (f"SELECT * FROM (SELECT {select} FROM {table_name} LIMIT {max(limit, sample_scan_limit)}) AS scanned "
+            f"ORDER BY random() LIMIT {limit}")
+
+
+def get_sample_frame(table_name: str, columns: Optional[List[str]] = None, limit: int = 3, strategy: str = "head",
+                     max_value_length: Optional[int] = None) -> pd.DataFrame:
+    """
+    Retrieves sample data for some or all columns of a table.
+
+    Args:
+        table_name (str): Name of the table.
+        columns (Optional[List[str]]): Columns to select. All columns when None.
+        limit (int): Number of rows, or of distinct values per column for the 'distinct' strategy.
+        strategy (str): 'head' takes the first rows, 'random' a random sample of rows and 'distinct' the first
+            distinct non-null values of each column within a random sample.
+        max_value_length (Optional[int]): Longer text values are truncated to this many characters.
+
+    Returns:
+        pd.DataFrame: Sample data with one column per selected column.
+
+    Raises:
+        ValueError: If the table, a column or the strategy is invalid, or the sample data retrieval fails.
+    """
+    table_columns = get_column_names(table_name)
+    if columns:
+        unknown = set(columns) - set(table_columns)
+        if unknown:
+            raise ValueError(f"Unknown columns for table '{table_name}': {sorted(unknown)}")
+    else:
+        columns = table_columns
+    if strategy not in ("head", "random", "distinct"):
+        raise ValueError(f"Unknown sampling strategy '{strategy}'. Use 'head', 'random' or 'distinct'.")
+
+    select = ", ".join(_quote(column) for column in columns)
+    try:
+        with engine.connect() as conn:
+            size = limit if strategy != "distinct" else limit * distinct_scan_factor
+            if strategy == "head":
+                query = f"SELECT {select} FROM {table_name} LIMIT {limit}"
+            else:
+                query = _random_sample_query(select, table_name, size, conn)
+            frame = pd.read_sql(text(query), conn)
+            if strategy != "head" and engine.dialect.name == 'postgresql' and len(frame) < size:
+                # TABLESAMPLE can return too few rows on small or skewed tables.
+                frame = pd.read_sql(text(_bounded_random_query(select, table_name, size)), conn)
+    except Exception as e:
+        raise ValueError(f"Failed to retrieve sample data for table '{table_name}': {str(e)}")
+
+    if strategy == "distinct":
+        frame = pd.DataFrame({
+            column: frame[column].dropna().drop_duplicates().head(limit).reset_index(drop=True)
+            for column in frame.columns
+        })
+    elif len(frame) > limit:
+        frame = frame.head(limit)
+
+    if max_value_length:
+        for column in frame.columns:
+            if frame[column].dtype == object:
+                frame[column] = frame[column].map(
+                    lambda value: value[:max_value_length] + "..." if isinstance(value, str) and len(value) > max_value_length else value
+                )
+    return frame
+
+
+def format_sample_frame(frame: pd.DataFrame, strategy: str = "head") -> str:
+    """
+    Formats sample data from get_sample_frame for a prompt.
+
+    Args:
+        frame (pd.DataFrame): Sample data.
+        strategy (str): Strategy the sample was taken with. The values of the 'distinct' strategy are sampled
+            per column, so they are listed per column rather than as rows.
+
+    Returns:
+        str: Rows in CSV format, or a labelled JSON object of the sample values of each column.
+    """
+    if strategy != "distinct":
+        return frame.to_csv(index=False, header=True)
+    values = {column: frame[column].dropna().tolist() for column in frame.columns}
+    return ("Sample values of each column, drawn independently - values of different columns are not from the same row:\n"
+            + json.dumps(values, default=str))
@@ -0,0 +1,84 @@
+"""Deterministic stand-in for a chat model, used to run the metadata pipeline without an LLM provider."""
+import ast
+import json
+import re
+import time
+from typing import List, Optional, Any
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatResult, ChatGeneration
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers metadata prompts with valid, synthetic metadata for the requested columns.
+
+    Attributes:
+        latency (float): Seconds each call takes.
+        request_sample_data (bool): Ask for the get_sample_data tool once per conversation, unless the
+            prompt already contains sample data.
+        max_output_columns (Optional[int]): Batches with more columns get a truncated answer, with
+            finish_reason 'length', like a model hitting its output token limit.
+    """
+    latency: float = 0.0
+    request_sample_data: bool = True
+    max_output_columns: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-metadata"
+
+
+    def bind_tools(self, tools: List[Any], **kwargs: Any) -> "FakeChatModel":
+        return self
+
+
+    def _requested_columns(self, messages: List[BaseMessage]) -> List[str]:
+        """Reads the column list from the latest human message."""
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                match = re.search(r"columns(?: next)?: (\[[^\]]*\])", str(message.content))
+                if match:
+                    return ast.literal_eval(match.group(1))
+        return []
+
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        has_sample_data = any(
+            isinstance(message, ToolMessage) or "Here is sample data" in str(message.content) for message in messages
+        )
+        if self.request_sample_data and not has_sample_data:
+            table_name = re.search(r"table: (\w+)", str(messages[-1].content)).group(1)
+            tool_call = {"name": "get_sample_data", "args": {"table_name": table_name}, "id": f"call_{len(messages)}"}
+            message = AIMessage(content="", tool_calls=[tool_call], response_metadata={
+                'token_usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 20}, 'finish_reason': 'tool_calls'
+            })
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        columns = self._requested_columns(messages)
+        metadata = {
+            "name": "synthetic",
+            "description": "Synthetic dataset generated for benchmarking.",
+            "columns": [
+                {
+                    "name": column,
+                    "data_type": "string",
+                    "description": f"Synthetic description of {column}.",
+                    "tags": ["Other"],
+                    "sensitivity": "not sensitive",
+                    "analysis": f"Generated by the fake model for {column}."
+                }
+                for column in columns
+            ]
+        }
+        content = f"```json\n{json.dumps(metadata, indent=2)}\n```"
+        finish_reason = 'stop'
+        if self.max_output_columns is not None and len(columns) > self.max_output_columns:
+            content = content[:len(content) // 2]
+            finish_reason = 'length'
+        message = AIMessage(content=content, response_metadata={
+            'token_usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4}, 'finish_reason': finish_reason
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
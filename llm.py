@@ -1,16 +1,34 @@
-from typing import TypedDict, List, Annotated, Dict, Any, Set
+from typing import TypedDict, List, Annotated, Dict, Any, Set, Optional, Callable, Iterator, Generator, Tuple
 import operator
+import pandas as pd
 import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.messages import BaseMessage, ToolMessage, HumanMessage
 from langchain.output_parsers import PydanticOutputParser
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolExecutor, ToolInvocation
 from metadata import DatasetMetadata
-from prompts import template
-from tools import get_sample_data
-from database import get_column_names
+from prompts import template, batch_template, template_version
+from tools import get_sample_data, ToolCallCache
+from database import get_column_names, get_column_types, get_sample_data as func_get_sample_data, get_sample_frame, format_sample_frame
+from cache import MetadataCache
+from rate_limit import RateLimiter
+from checkpoint import CheckpointStore
+from llm_clients import LLMClientRegistry, llm_clients
+from column_store import ColumnStore, column_signature
+from metadata_catalog import MetadataCatalog
+from classifier import classify_columns, format_hints, detector_precision
+from confidence import column_confidence
+from tracing import Tracer, logger
+from config import model_limits, default_model_limits, max_columns_per_batch
+from config import sample_rows, sample_strategy, sample_max_value_length, profile_sample_rows
+from config import cascade_models, cascade_confidence_threshold, tool_max_workers, max_tool_rounds
+from config import max_missing_column_rounds
+
+
+class BatchParseError(ValueError):
+    """Raised when the LLM response for a column batch is truncated or cannot be parsed."""
 
 
 class AgentState(TypedDict):
@@ -23,29 +41,75 @@ class AgentState(TypedDict):
     next_column_batch: List[str]
     messages: Annotated[List[BaseMessage], operator.add]
     metadata: DatasetMetadata
+    context_mode: str
+    table_sample: Any
+    batch_start: int
+    batch_index: int
+    token_usage: Annotated[List[Dict[str, Any]], operator.add]
+    run_id: str
+    retries: int
+    tracer: Tracer
+    classifier_mode: Optional[str]
+    column_hints: Dict[str, Dict[str, Any]]
+    hint_checks: Annotated[List[Dict[str, Any]], operator.add]
+    tool_cache: ToolCallCache
+    options: str
+    column_types: Dict[str, str]
+    missing_counts: Dict[str, int]
 
 
 class MetadataGenerator:
     """Class responsible for generating metadata using the Language Model (LLM)."""
 
-    def __init__(self):
-        """Initializes the MetadataGenerator with the prompt, tools, tool executor, output parser, and workflow graph."""
+    def __init__(self, cache: Optional[MetadataCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 checkpoints: Optional[CheckpointStore] = None, clients: LLMClientRegistry = llm_clients,
+                 column_store: Optional[ColumnStore] = None, metadata_catalog: Optional[MetadataCatalog] = None):
+        """
+        Initializes the MetadataGenerator with the prompt, tools, tool executor, output parser, and workflow graph.
+
+        Args:
+            cache (Optional[MetadataCache]): Persistent cache of generated metadata. Disabled when None.
+            rate_limiter (Optional[RateLimiter]): Limits the request and token rate of LLM calls. Disabled when None.
+            checkpoints (Optional[CheckpointStore]): Store of the metadata of completed batches, used to resume
+                failed runs. Disabled when None.
+            clients (LLMClientRegistry): Registry of the shared LLM clients.
+            column_store (Optional[ColumnStore]): Store of column metadata reused across tables by column signature.
+                Disabled when None.
+            metadata_catalog (Optional[MetadataCatalog]): Searchable catalog to which the metadata of every table is
+                written after generation. Disabled when None.
+        """
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.checkpoints = checkpoints
+        self.clients = clients
+        self.column_store = column_store
+        self.metadata_catalog = metadata_catalog
         self.prompt = template
+        self.batch_prompt = batch_template
         self.tools = [get_sample_data]
         self.tool_executor = ToolExecutor(tools=self.tools)
+        self.tool_pool = ThreadPoolExecutor(max_workers=tool_max_workers)
         self.parser = PydanticOutputParser(pydantic_object=DatasetMetadata)
         self.wf = self._build_graph()
+        self.batch_wf = self._build_batch_graph()
 
 
     def _build_graph(self) -> StateGraph:
         """Builds the workflow graph for the metadata generation process."""
         g = StateGraph(AgentState)
-        g.add_node("init", self._init_state)
-        g.add_node("prompt", self._prompt)
-        g.add_node("model", self._model)
-        g.add_node("tool", self._tool)
-        g.add_node("parse", self._parse)
-        g.add_edge("init", "prompt")
+        g.add_node("init", self._traced("init", self._init_state))
+        g.add_node("prompt", self._traced("prompt", self._prompt))
+        g.add_node("model", self._traced("model", self._model))
+        g.add_node("tool", self._traced("tool", self._tool))
+        g.add_node("parse", self._traced("parse", self._parse))
+        g.add_conditional_edges(
+            "init",
+            self._should_continue_generation,
+            {
+                "yes": "prompt",
+                "no": END
+            }
+        )
         g.add_edge("prompt", "model")
         g.add_edge("tool", "model")
         g.add_conditional_edges(
@@ -69,57 +133,176 @@ class MetadataGenerator:
         return wf
 
 
-    def _print_state(self, func, state):
-        print(f"__ {func} __")
-        print(f"keys in state: {state.keys()}")
-        keys = ['columns', 'processed_columns', 'next_column_batch']
-        for key in keys:
-            print(f"** {key}: {state[key]}")
-        print("===")
-        
-            
+    def _build_batch_graph(self) -> StateGraph:
+        """Builds the workflow graph that generates metadata for a single, pre-selected column batch."""
+        g = StateGraph(AgentState)
+        g.add_node("prompt", self._traced("prompt", self._prompt))
+        g.add_node("model", self._traced("model", self._model))
+        g.add_node("tool", self._traced("tool", self._tool))
+        g.add_node("parse", self._traced("parse", self._parse_batch))
+        g.add_edge("prompt", "model")
+        g.add_edge("tool", "model")
+        g.add_conditional_edges(
+            "model",
+            self._should_execute_tools,
+            {
+                "yes": "tool",
+                "no": "parse"
+            }
+        )
+        g.add_edge("parse", END)
+        g.set_entry_point("prompt")
+        wf = g.compile()
+        return wf
+
+
+    def _traced(self, name: str, node: Callable[[AgentState], Dict[str, Any]]) -> Callable[[AgentState], Dict[str, Any]]:
+        """Wraps a graph node in a span of the run's tracer, with the batch size, tokens, tool calls and retries."""
+        def traced_node(state: AgentState) -> Dict[str, Any]:
+            tracer = state.get('tracer')
+            if not tracer:
+                return node(state)
+            with tracer.span(name, batch=state.get('batch_index') or 0, batch_size=len(state.get('next_column_batch') or [])) as span:
+                update = node(state)
+                for usage in update.get('token_usage') or []:
+                    span['prompt_tokens'] = span.get('prompt_tokens', 0) + usage['prompt_tokens']
+                    span['completion_tokens'] = span.get('completion_tokens', 0) + usage['completion_tokens']
+                if name == 'tool':
+                    span['tool_calls'] = len(update.get('messages') or [])
+                if (update.get('retries') or 0) > (state.get('retries') or 0):
+                    span['retries'] = update['retries'] - (state.get('retries') or 0)
+            return update
+        return traced_node
+
+
     def _init_state(self, state: AgentState) -> Dict[str, Any]:
-        """Initialize state."""
-        self._print_state("_init_state", state)
+        """Initialize state, keeping the columns already processed by a resumed run."""
         columns = set(get_column_names(state['table_name']))
-        processed_columns = set()
-        next_column_batch = set()
-        return {'columns': columns, 'next_column_batch': next_column_batch, 'processed_columns': processed_columns}
+        processed_columns = set(state.get('processed_columns') or set()) & columns
+        update = {'columns': columns, 'processed_columns': processed_columns, 'batch_start': 0, 'batch_index': 0, 'retries': 0}
+        if state.get('context_mode') == 'isolated' and columns - processed_columns:
+            # fetched once; each batch prompt includes the sample of its own columns.
+            update['table_sample'] = get_sample_frame(state['table_name'], limit=sample_rows, strategy=sample_strategy,
+                                                      max_value_length=sample_max_value_length)
+        if not state.get('columns_per_batch'):
+            update['columns_per_batch'] = self._estimate_columns_per_batch(state['model_name'], sorted(columns), update.get('table_sample'))
+        update['next_column_batch'] = self._next_column_batch({**state, **update})
+        metadata = state.get('metadata')
+        if metadata:
+            # drop columns that are no longer in the table.
+            update['metadata'] = DatasetMetadata(
+                name=metadata.name,
+                description=metadata.description,
+                columns=[column for column in metadata.columns if column.name in columns]
+            )
+        return update
+
+
+    def _estimate_columns_per_batch(self, model_name: str, columns: List[str], table_sample: Optional[pd.DataFrame] = None) -> int:
+        """
+        Sizes column batches so that the response fits the model's output limit and the prompt its context window.
+
+        Args:
+            model_name (str): Name of the LLM model.
+            columns (List[str]): Columns of the table.
+            table_sample (Optional[pd.DataFrame]): Sample data whose batch columns are included in each prompt, if any.
+
+        Returns:
+            int: Number of columns per batch, between 1 and `max_columns_per_batch`.
+        """
+        if not columns:
+            return max_columns_per_batch
+        limits = model_limits.get(model_name, default_model_limits)
+        # rough token counts: ~4 characters per token. Each column's output repeats its name and has a
+        # data type, tags, sensitivity, description and analysis - about 200 tokens.
+        name_tokens = sum(len(column) for column in columns) / len(columns) / 4
+        output_per_column = 200 + 2 * name_tokens
+        output_budget = 0.8 * limits['max_output_tokens'] - 150
+        format_instructions_tokens = len(self.parser.get_format_instructions()) / 4
+        sample_tokens = 0 if table_sample is None else len(format_sample_frame(table_sample, sample_strategy)) / 4 / len(columns)
+        input_budget = limits['context_window'] - limits['max_output_tokens'] - format_instructions_tokens
+        columns_per_batch = min(output_budget / output_per_column, input_budget / (name_tokens + sample_tokens + 2))
+        return int(max(1, min(max_columns_per_batch, columns_per_batch)))
 
 
     def _prompt(self, state: AgentState) -> Dict[str, Any]:
         """Generates the prompt."""
-        self._print_state("_prompt", state)
         table_name = state['table_name']
         format_instructions = self.parser.get_format_instructions()
-        next_column_batch = self._next_column_batch(state)
-        input = {"table_name": table_name, "format_instructions": format_instructions, 'next_column_batch': next_column_batch}
-        response = self.prompt.invoke(input)
-        return {'messages': response.messages, 'next_column_batch': next_column_batch}
+        next_column_batch = state.get('next_column_batch') or self._next_column_batch(state)
+        if state.get('context_mode') == 'isolated':
+            messages = self._batch_messages(state, next_column_batch)
+        else:
+            input = {"table_name": table_name, "format_instructions": format_instructions, 'next_column_batch': next_column_batch,
+                     "column_hints": format_hints(state.get('column_hints') or {}, next_column_batch)}
+            messages = self.prompt.invoke(input).messages
+        return {'messages': messages, 'next_column_batch': next_column_batch, 'batch_start': len(state.get('messages') or [])}
+
+
+    def _batch_messages(self, state: AgentState, next_column_batch: List[str]) -> List[BaseMessage]:
+        """Builds a self-contained prompt for one column batch from the shared table summary."""
+        input = {
+            "table_name": state['table_name'],
+            "table_summary": format_sample_frame(state['table_sample'][next_column_batch], sample_strategy),
+            "next_column_batch": next_column_batch,
+            "column_hints": format_hints(state.get('column_hints') or {}, next_column_batch),
+            "format_instructions": self.parser.get_format_instructions()
+        }
+        return self.batch_prompt.invoke(input).messages
 
 
     def _model(self, state: AgentState) -> Dict[str, Any]:
         """Invokes the LLM model to generate metadata."""
-        self._print_state("_model", state)
         model_name = state['model_name']
-        self.model = ChatOpenAI(model_name=model_name, temperature=0).bind_tools(tools=self.tools)
-        messages = state['messages']
-        response = self.model.invoke(messages)
-        return {'messages': [response]}
+        client = self.clients.get(model_name, self.tools)
+        # only the messages of the current batch; earlier batches are not resent in isolated mode.
+        messages = state['messages'][state.get('batch_start') or 0:]
+        estimated_tokens = sum(len(str(message.content)) for message in messages) // 4
+        if self.rate_limiter:
+            self.rate_limiter.acquire(model_name, estimated_tokens)
+        response = client.invoke(messages)
+        usage = {
+            'batch': state.get('batch_index') or 0,
+            'columns': len(state.get('next_column_batch') or []),
+            'messages': len(messages),
+            **self._token_usage(response)
+        }
+        used_tokens = usage['prompt_tokens'] + usage['completion_tokens']
+        if self.rate_limiter and used_tokens:
+            self.rate_limiter.record(model_name, used_tokens - estimated_tokens)
+        return {'messages': [response], 'token_usage': [usage]}
+
+
+    def _token_usage(self, message: BaseMessage) -> Dict[str, int]:
+        """Reads prompt and completion token counts from an LLM response, when the provider reports them."""
+        usage = getattr(message, 'usage_metadata', None)
+        if usage:
+            return {'prompt_tokens': usage.get('input_tokens', 0), 'completion_tokens': usage.get('output_tokens', 0)}
+        usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+        return {'prompt_tokens': usage.get('prompt_tokens', 0), 'completion_tokens': usage.get('completion_tokens', 0)}
 
 
     def _tool(self, state: AgentState) -> Dict[str, Any]:
-        """Executes tool calls."""
-        self._print_state("_tool", state)
+        """Executes all tool calls of the last message at the same time, reusing the results of identical calls in the run."""
         message = state['messages'][-1]
-        tool_call = message.tool_calls[0]
-        id = tool_call['id']
-        tool = tool_call['name']
-        tool_input = tool_call['args']
-        action = ToolInvocation(tool=tool, tool_input=tool_input)
-        response = self.tool_executor.invoke(action)
-        tool_message = ToolMessage(content=str(response), name=tool, tool_call_id=id)
-        return {'messages': [tool_message]}
+        tool_cache = state.get('tool_cache')
+
+        def execute(tool_call: Dict[str, Any]) -> Any:
+            action = ToolInvocation(tool=tool_call['name'], tool_input=tool_call['args'])
+            if tool_cache is None:
+                return self.tool_executor.invoke(action)
+            return tool_cache.get_or_call(tool_call['name'], tool_call['args'], lambda: self.tool_executor.invoke(action))
+
+        tool_calls = message.tool_calls
+        if len(tool_calls) == 1:
+            responses = [execute(tool_calls[0])]
+        else:
+            responses = list(self.tool_pool.map(execute, tool_calls))
+        tool_messages = [
+            ToolMessage(content=str(response), name=tool_call['name'], tool_call_id=tool_call['id'])
+            for tool_call, response in zip(tool_calls, responses)
+        ]
+        return {'messages': tool_messages}
 
 
     def _extract_json_content(self, text: str) -> str:
@@ -141,68 +324,152 @@ class MetadataGenerator:
         return None
 
 
-    def _update_metadata(self, metadata, state: AgentState) -> None:
-        """Update object"""
-        self._print_state("_update_metadata", state)
-        curr_metadata = state.get('metadata')
-        if curr_metadata:
-            metadata.columns = curr_metadata.columns + metadata.columns
+    def _merge_metadata(self, items: List[Optional[DatasetMetadata]]) -> Optional[DatasetMetadata]:
+        """Merges per-batch metadata into one object, keeping the first entry seen for each column."""
+        items = [item for item in items if item]
+        if not items:
+            return None
+        columns = {}
+        for item in items:
+            for column in item.columns:
+                columns.setdefault(column.name, column)
+        first = items[0]
+        description = next((item.description for item in items if item.description), first.description)
+        return DatasetMetadata(name=first.name, description=description, columns=list(columns.values()))
 
 
-    def _next_column_batch(self, state):
-        self._print_state("_next_column_batch", state)
-        dataset_columns = set(get_column_names(state['table_name']))
-        # print(f"dataset_columns: {dataset_columns}")
-        if not state.get('columns'):
-            columns = dataset_columns
-        else:
-            columns = state['columns']
-        # print(f"columns: {columns}")
-        
-        processed_columns = state.get('processed_columns')
-        if not processed_columns:
-            processed_columns = set()
-        # print(f"processed_columns: {processed_columns}")
-        
-        columns_to_process = columns.difference(processed_columns)
-        # print(f"columns_to_process: {columns_to_process}")
-        sotrted_columns_to_process = sorted(list(columns_to_process))
-        # print(f"sotrted_columns_to_process: {sotrted_columns_to_process}")
+    def _column_batches(self, state: AgentState) -> List[List[str]]:
+        """Splits the columns that are not processed yet into batches of `columns_per_batch`."""
+        columns = state.get('columns')
+        if not columns:
+            columns = set(get_column_names(state['table_name']))
+        processed_columns = state.get('processed_columns') or set()
+        columns_to_process = sorted(columns.difference(processed_columns))
         columns_per_batch = state['columns_per_batch']
-        next_column_batch = sotrted_columns_to_process[:columns_per_batch]
-        # print(f"next_column_batch: {next_column_batch}")
-        return next_column_batch
-        
-        
-    def _parse(self, state: AgentState) -> Dict[str, Any]:
-        """Parses the generated metadata from the LLM response."""
-        self._print_state("_parse", state)
-        last_message = state['messages'][-1]
-        print(f"message.content:\n{last_message.content}")
-        json_text = self._extract_json_content(last_message.content)
-        print(f"json_text:\n{json_text}")
+        return [columns_to_process[i:i + columns_per_batch] for i in range(0, len(columns_to_process), columns_per_batch)]
+
+
+    def _next_column_batch(self, state: AgentState) -> List[str]:
+        """Returns the next batch of columns to process, or an empty list when all are processed."""
+        batches = self._column_batches(state)
+        return batches[0] if batches else []
+
+
+    def _parse_metadata(self, message: BaseMessage) -> DatasetMetadata:
+        """Parses the metadata in an LLM response."""
+        logger.debug("LLM response: %s", message.content)
+        if (getattr(message, 'response_metadata', None) or {}).get('finish_reason') == 'length':
+            raise BatchParseError("the response was truncated at the output token limit")
+        json_text = self._extract_json_content(message.content)
         if not json_text:
-            raise ValueError("Json text is empty")
+            raise BatchParseError("Json text is empty")
         try:
-            obj = DatasetMetadata(**json.loads(json_text))
-            state['processed_columns'].update([column.name for column in obj.columns])
-            next_column_batch = self._next_column_batch(state)
-            self._update_metadata(obj, state)
+            return DatasetMetadata(**json.loads(json_text))
         except Exception as e:
-            raise ValueError("unable to extract json content from the response")
+            raise BatchParseError("unable to extract json content from the response")
+
+
+    def _batch_request(self, state: AgentState, next_column_batch: List[str], note: str = "") -> Dict[str, Any]:
+        """Builds the messages that ask for the next column batch, and where that batch's messages start."""
+        if state.get('context_mode') == 'isolated':
+            return {'messages': self._batch_messages(state, next_column_batch), 'batch_start': len(state['messages'])}
+        hints = format_hints(state.get('column_hints') or {}, next_column_batch)
+        message = HumanMessage(f"{note}Process these columns next: {next_column_batch}. {hints}Foramt your output as follows:{self.parser.get_format_instructions()}.")
+        return {'messages': [message], 'batch_start': state.get('batch_start') or 0}
+
+
+    def _split_batch(self, state: AgentState) -> Dict[str, Any]:
+        """Retries the first half of a batch whose response could not be parsed; the rest follows in later batches."""
+        batch = state['next_column_batch']
+        if len(batch) <= 1:
+            raise ValueError(f"unable to generate metadata for the columns {batch}")
+        columns_per_batch = len(batch) // 2
+        next_column_batch = batch[:columns_per_batch]
+        note = "Your previous response was incomplete or not valid json. "
+        return {
+            **self._batch_request(state, next_column_batch, note),
+            'next_column_batch': next_column_batch,
+            'columns_per_batch': columns_per_batch,
+            'retries': (state.get('retries') or 0) + 1
+        }
+
+
+    def _parse(self, state: AgentState) -> Dict[str, Any]:
+        """Parses the generated metadata from the LLM response."""
+        try:
+            obj = self._parse_metadata(state['messages'][-1])
+        except BatchParseError:
+            return self._split_batch(state)
+        obj, hint_checks = self._apply_hints(state, obj)
+        # columns the answer left out are requested again in later batches, a bounded number of times.
+        answered = {column.name for column in obj.columns}
+        missing_counts = dict(state.get('missing_counts') or {})
+        for column in state['next_column_batch']:
+            if column not in answered:
+                missing_counts[column] = missing_counts.get(column, 0) + 1
+        failed = sorted(column for column, count in missing_counts.items() if count > max_missing_column_rounds)
+        if failed:
+            raise ValueError(f"unable to generate metadata for the columns {failed}")
+        self._save_checkpoint(state, obj)
+        processed_columns = state['processed_columns'] | answered
+        next_column_batch = self._next_column_batch({**state, 'processed_columns': processed_columns})
+        metadata = self._merge_metadata([state.get('metadata'), obj])
+        batch_index = (state.get('batch_index') or 0) + 1
         if next_column_batch: 
-            message = HumanMessage(f"Process these columns next: {next_column_batch}. Foramt your output as follows:{self.parser.get_format_instructions()}.")
             return {
-                'messages': [message], 
-                'metadata': obj, 'next_column_batch': next_column_batch
+                **self._batch_request(state, next_column_batch), 'processed_columns': processed_columns,
+                'metadata': metadata, 'next_column_batch': next_column_batch, 'batch_index': batch_index,
+                'hint_checks': hint_checks, 'missing_counts': missing_counts
             }
         else:
-            return {'metadata': obj, 'next_column_batch': next_column_batch}
+            return {'metadata': metadata, 'processed_columns': processed_columns, 'next_column_batch': next_column_batch,
+                    'batch_index': batch_index, 'hint_checks': hint_checks, 'missing_counts': missing_counts}
+
+
+    def _parse_batch(self, state: AgentState) -> Dict[str, Any]:
+        """Parses the metadata for a single column batch."""
+        obj = self._parse_metadata(state['messages'][-1])
+        obj, hint_checks = self._apply_hints(state, obj)
+        self._save_checkpoint(state, obj)
+        return {'metadata': obj, 'processed_columns': {column.name for column in obj.columns}, 'hint_checks': hint_checks}
+
+
+    def _apply_hints(self, state: AgentState, metadata: DatasetMetadata) -> Tuple[DatasetMetadata, List[Dict[str, Any]]]:
+        """
+        Checks the LLM's tags and sensitivity against the pattern detection hints and, in 'override' mode,
+        replaces its data type and sensitivity with the hinted ones and adds the hinted tags.
+
+        Returns:
+            Tuple[DatasetMetadata, List[Dict[str, Any]]]: The metadata, and for every hinted column the 'detector',
+                the 'column' and whether the LLM 'agreed' with the hint.
+        """
+        hints = state.get('column_hints') or {}
+        checks = []
+        columns = []
+        for column in metadata.columns:
+            hint = hints.get(column.name)
+            if hint:
+                agreed = set(hint['tags']) <= set(column.tags or []) and (column.sensitivity or "").lower() == hint['sensitivity'].lower()
+                checks.append({'detector': hint['detector'], 'column': column.name, 'agreed': agreed})
+                if state.get('classifier_mode') == 'override':
+                    column = column.copy(update={
+                        'data_type': hint['data_type'],
+                        'tags': sorted(set(column.tags or []) | set(hint['tags'])),
+                        'sensitivity': hint['sensitivity']
+                    })
+            columns.append(column)
+        return DatasetMetadata(name=metadata.name, description=metadata.description, columns=columns), checks
+
+
+    def _save_checkpoint(self, state: AgentState, metadata: DatasetMetadata) -> None:
+        """Saves the metadata of a completed batch so that a failed run can resume after it."""
+        if self.checkpoints and state.get('run_id'):
+            self.checkpoints.save_batch(state['run_id'], state['table_name'], state['model_name'], metadata,
+                                        state['options'], state['column_types'])
 
 
     def _should_execute_tools(self, state: AgentState) -> str:
         """Determines whether to continue with tool execution or parse the output"""
-        self._print_state("_should_execute_tools", state)
         message = state['messages'][-1]
         if len(message.tool_calls) > 0:
             return "yes"
@@ -211,20 +478,462 @@ class MetadataGenerator:
 
     def _should_continue_generation(self, state: AgentState) -> str:
         """Determines whether to continue with tool execution or parse the output"""
-        self._print_state("_should_continue_generation", state)
         next_column_batch = state.get('next_column_batch')
         if next_column_batch:
             return "yes"
         return "no"
 
 
-    def generate_metadata(self, table_name: str, model_name: str) -> Dict[str, Any]:
-        """Generates metadata for the given table using the specified LLM model."""
+    def generate_metadata(self, table_name: str, model_name: str, concurrency: int = 1, context_mode: str = "isolated",
+                          run_id: Optional[str] = None, columns_per_batch: Optional[int] = None,
+                          incremental: bool = False, classifier_mode: Optional[str] = None,
+                          seed: Optional[DatasetMetadata] = None, store_columns: bool = True) -> Dict[str, Any]:
+        """
+        Generates metadata for the given table using the specified LLM model.
+
+        Args:
+            table_name (str): Name of the table.
+            model_name (str): Name of the LLM model.
+            concurrency (int): Maximum number of column batches sent to the LLM at the same time.
+                With 1, batches are processed one after another.
+            context_mode (str): 'isolated' sends each batch with only the system prompt, sample data fetched
+                once for the table and its own columns. 'shared' keeps one conversation in which every batch
+                resends the messages of the earlier batches.
+            run_id (Optional[str]): Identifier of the run. With a checkpoint store, the metadata of every completed
+                batch is saved under this id, and a rerun with the same id only processes the remaining columns.
+            columns_per_batch (Optional[int]): Number of columns per batch. When None, it is estimated from the
+                model's output and context limits. A batch whose response is truncated or cannot be parsed is
+                split in half and retried either way.
+            incremental (bool): Reuse the table's most recent metadata generated by the same model with the same
+                prompt and options for the columns whose name and type are unchanged, and only generate metadata
+                for added or retyped columns. Removed columns are dropped. Requires a cache.
+            classifier_mode (Optional[str]): Runs pattern detectors (email, phone, card number, ZIP code,
+                timestamp, date, latitude/longitude) over a sample of every column before generation.
+                'hint' passes the detected data type, tags and sensitivity to the LLM in the prompt; 'override'
+                also replaces the LLM's values with them. Disabled when None.
+            seed (Optional[DatasetMetadata]): Metadata kept as is; only the other columns are sent to the LLM.
+                The cache is neither read nor written, as the result mixes metadata from different runs, and
+                no column metadata is reused from the column store.
+            store_columns (bool): Add the generated columns to the column store. When False, the final state has
+                their signatures under 'column_signatures', for the caller to add the columns it keeps.
+
+        Returns:
+            Dict[str, Any]: Final state of the workflow, with the merged metadata under 'metadata', the
+                prompt and completion tokens of every LLM call under 'token_usage' and a summary of the
+                timed spans of the run under 'metrics'.
+                'cached' is True when the metadata was served from the cache. In incremental mode,
+                'schema_diff' lists the added, retyped and removed columns. With a column store,
+                'column_reuse' lists the reused columns and the store's hit rate. With a classifier mode,
+                'classifier' has the column 'hints' and, for every detector, its time, matches and the share of
+                its hints the LLM agreed with. 'tool_calls' counts the tool calls served from the run's
+                cache of identical calls ('hits') and executed ('misses').
+        """
+        events = self.stream_metadata(table_name, model_name, concurrency=concurrency, context_mode=context_mode,
+                                      run_id=run_id, columns_per_batch=columns_per_batch, incremental=incremental,
+                                      classifier_mode=classifier_mode, seed=seed, store_columns=store_columns)
+        for event in events:
+            pass
+        return event
+
+
+    def stream_metadata(self, table_name: str, model_name: str, concurrency: int = 1, context_mode: str = "isolated",
+                        run_id: Optional[str] = None, columns_per_batch: Optional[int] = None,
+                        incremental: bool = False, classifier_mode: Optional[str] = None,
+                        seed: Optional[DatasetMetadata] = None, store_columns: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Generates metadata like generate_metadata, yielding progress as every column batch completes.
+
+        Args:
+            Same as generate_metadata.
+
+        Yields:
+            Dict[str, Any]: After each batch, 'metadata' merged so far, the number of 'processed' columns out of
+                'total' and 'done' set to False. The last event is the final state returned by generate_metadata,
+                with 'done' set to True.
+        """
+        if context_mode not in ("isolated", "shared"):
+            raise ValueError(f"Unknown context mode '{context_mode}'. Use 'isolated' or 'shared'.")
+        if classifier_mode not in (None, "hint", "override"):
+            raise ValueError(f"Unknown classifier mode '{classifier_mode}'. Use 'hint', 'override' or None.")
         input = {
             "table_name": table_name,
             "model_name": model_name,
-            "columns_per_batch": 20
+            "columns_per_batch": columns_per_batch,
+            "context_mode": context_mode,
+            "classifier_mode": classifier_mode,
+            "tool_cache": ToolCallCache(),
+            "tracer": Tracer(table_name=table_name, model_name=model_name, run_id=run_id)
         }
-        response = self.wf.invoke(input)
-        return response
-    
\ No newline at end of file
+        tracer = input['tracer']
+        # metadata generated with other prompts or options is neither served from the cache nor reused.
+        options = self._run_options(context_mode, classifier_mode)
+        cache_key = None
+        if self.cache and not seed:
+            with tracer.span('cache') as span:
+                columns = get_column_names(table_name)
+                sample_rows = func_get_sample_data(table_name)
+                cache_key = self.cache.make_key(table_name, columns, sample_rows, options, model_name)
+                metadata = self.cache.get(cache_key)
+                span['hit'] = metadata is not None
+            if metadata:
+                if self.metadata_catalog:
+                    # the catalog may have been written by another model, or emptied, since the metadata was cached.
+                    with tracer.span('catalog'):
+                        self.metadata_catalog.save(table_name, model_name, metadata)
+                yield {**input, 'columns': set(columns), 'processed_columns': set(columns), 'next_column_batch': [],
+                       'metadata': metadata, 'token_usage': [], 'cached': True, 'metrics': tracer.summary(),
+                       'processed': len(columns), 'total': len(columns), 'done': True}
+                return
+
+        schema_diff = None
+        if incremental and self.cache:
+            schema_diff = self._seed_from_latest(input, options)
+
+        if self.checkpoints and run_id:
+            input['run_id'] = run_id
+            input['options'] = options
+            input['column_types'] = get_column_types(table_name)
+            checkpoint = self.checkpoints.load(run_id, model_name, options, input['column_types'])
+            if checkpoint:
+                input['processed_columns'] = (input.get('processed_columns') or set()) | checkpoint['processed_columns']
+                input['metadata'] = self._merge_metadata([input.get('metadata'), checkpoint['metadata']])
+
+        if seed:
+            input['processed_columns'] = (input.get('processed_columns') or set()) | {column.name for column in seed.columns}
+            input['metadata'] = self._merge_metadata([input.get('metadata'), seed])
+
+        profile = None
+        if self.column_store or classifier_mode:
+            processed_columns = input.get('processed_columns') or set()
+            column_types = {name: data_type for name, data_type in get_column_types(table_name).items() if name not in processed_columns}
+            if column_types:
+                # one sample of the remaining columns serves both column signatures and pattern detection.
+                profile = (column_types, get_sample_frame(table_name, list(column_types), limit=profile_sample_rows, strategy="random"))
+
+        signatures = {}
+        reused_columns = []
+        if self.column_store and profile:
+            column_types, sample = profile
+            signatures = {name: column_signature(name, data_type, sample[name]) for name, data_type in column_types.items()}
+            if not seed:
+                # seeded runs, such as escalation tiers of a cascade, must describe their columns themselves.
+                with tracer.span('column_reuse') as span:
+                    reused_columns = self._reuse_columns(input, signatures, options)
+                    span['reused'] = len(reused_columns)
+
+        detector_stats = None
+        if classifier_mode and profile:
+            with tracer.span('classifier') as span:
+                pending = [name for name in profile[1].columns if name not in reused_columns]
+                input['column_hints'], detector_stats = classify_columns(profile[1][pending])
+                span['hints'] = len(input['column_hints'])
+
+        if concurrency > 1:
+            response = yield from self._stream_concurrently(input, concurrency)
+        else:
+            response = yield from self._stream_sequentially(input)
+
+        if self.checkpoints and run_id:
+            self.checkpoints.delete(run_id)
+        if cache_key and response.get('metadata'):
+            self.cache.put(cache_key, table_name, model_name, response['metadata'])
+            self.cache.save_latest(table_name, model_name, response['metadata'], get_column_types(table_name), options)
+        if self.metadata_catalog and response.get('metadata'):
+            with tracer.span('catalog'):
+                self.metadata_catalog.save(table_name, model_name, response['metadata'])
+        generated_signatures = {name: signature for name, signature in signatures.items() if name not in reused_columns}
+        if self.column_store and store_columns and response.get('metadata'):
+            for column in response['metadata'].columns:
+                if column.name in generated_signatures:
+                    self.column_store.add(generated_signatures[column.name], column, table_name, model_name, options)
+        column_reuse = {'reused': reused_columns, **self.column_store.stats()} if self.column_store else None
+        classifier = None
+        if classifier_mode:
+            classifier = {
+                'hints': input.get('column_hints') or {},
+                'detectors': detector_precision(detector_stats or {}, response.get('hint_checks') or [])
+            }
+        yield {**response, 'cached': False, 'metrics': tracer.summary(), 'processed': len(response['processed_columns']),
+               'total': len(response['columns']), 'done': True, 'schema_diff': schema_diff, 'column_reuse': column_reuse,
+               'classifier': classifier, 'tool_calls': input['tool_cache'].stats(),
+               'column_signatures': {} if store_columns else generated_signatures}
+
+
+    def cascade_metadata(self, table_name: str, models: Optional[List[str]] = None,
+                         threshold: float = cascade_confidence_threshold, **kwargs) -> Dict[str, Any]:
+        """
+        Generates metadata with the cheapest model first, and sends only the columns it described with low
+        confidence to the next, stronger model.
+
+        Args:
+            table_name (str): Name of the table.
+            models (Optional[List[str]]): Models tried in order. Defaults to `cascade_models`.
+            threshold (float): Columns whose confidence score (see confidence.column_confidence) is lower are
+                sent to the next model. The last model's metadata is kept whatever its score.
+            **kwargs: Passed to generate_metadata, such as concurrency, context_mode, run_id or classifier_mode.
+
+        Returns:
+            Dict[str, Any]: Final state like generate_metadata, with the metadata of all tiers merged, the
+                'classifier' detector stats added up over all tiers, and 'cascade' holding the 'confidence' score
+                of every column and, for every tier, its 'model', the columns it was sent, the columns 'escalated'
+                from it, LLM calls, tokens and seconds. The result is cached under the cascade's models and
+                threshold; a cached result has no tiers.
+        """
+        events = self.stream_cascade(table_name, models=models, threshold=threshold, **kwargs)
+        for event in events:
+            pass
+        return event
+
+
+    def stream_cascade(self, table_name: str, models: Optional[List[str]] = None,
+                       threshold: float = cascade_confidence_threshold, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Runs cascade_metadata, yielding the progress events of every tier.
+
+        Args:
+            Same as cascade_metadata.
+
+        Yields:
+            Dict[str, Any]: Progress events of each tier like stream_metadata; the last event is the final state
+                returned by cascade_metadata.
+        """
+        models = models or cascade_models
+        run_id = kwargs.pop('run_id', None)
+        # the result mixes the models' metadata, so it is cached under the cascade as a whole.
+        cascade_name = "cascade:" + "+".join(models)
+        options = f"{template_version}/{kwargs.get('context_mode', 'isolated')}/{kwargs.get('classifier_mode')}/{threshold}"
+        cache_key = None
+        if self.cache:
+            columns = get_column_names(table_name)
+            cache_key = self.cache.make_key(table_name, columns, func_get_sample_data(table_name), options, cascade_name)
+            metadata = self.cache.get(cache_key)
+            if metadata:
+                if self.metadata_catalog:
+                    self.metadata_catalog.save(table_name, cascade_name, metadata)
+                yield {'table_name': table_name, 'model_name': cascade_name, 'columns': set(columns),
+                       'processed_columns': set(columns), 'next_column_batch': [], 'metadata': metadata, 'token_usage': [],
+                       'cached': True, 'metrics': Tracer(table_name=table_name, model_name=cascade_name).summary(),
+                       'processed': len(columns), 'total': len(columns), 'done': True, 'classifier': None,
+                       'cascade': {'confidence': {}, 'tiers': []}}
+                return
+
+        seed = None
+        tiers = []
+        confidence = {}
+        hints = None
+        classifier_hints = {}
+        detector_stats = {}
+        hint_checks = {}
+        for i, model_name in enumerate(models):
+            response = None
+            # later tiers are seeded with the kept columns of the previous tier; incremental seeding would merge this
+            # model's latest metadata of the table back in, including for the escalated columns.
+            tier_options = {**kwargs, 'incremental': False} if seed else kwargs
+            for event in self.stream_metadata(table_name, model_name, run_id=f"{run_id}/{model_name}" if run_id else None,
+                                              seed=seed, store_columns=False, **tier_options):
+                if event['done']:
+                    response = event
+                else:
+                    yield event
+            if response.get('classifier'):
+                # each tier only classifies the columns it is sent; add up the detectors over all tiers.
+                classifier_hints.update(response['classifier']['hints'])
+                for name, entry in response['classifier']['detectors'].items():
+                    total = detector_stats.setdefault(name, {'seconds': 0.0, 'columns': 0, 'matches': 0})
+                    for key in total:
+                        total[key] += entry[key]
+            for check in response.get('hint_checks') or []:
+                # an escalated column is judged by the metadata of the tier that is kept.
+                hint_checks[check['column']] = check
+            metadata = response['metadata']
+            seeded = {column.name for column in seed.columns} if seed else set()
+            new_columns = [column for column in metadata.columns if column.name not in seeded]
+            if hints is None:
+                hints = (response.get('classifier') or {}).get('hints')
+            if hints is None:
+                # the heuristics the confidence score checks tags and sensitivity against. Names the model made up
+                # or miscased are not in the table; they are scored without a hint.
+                known = [column.name for column in new_columns if column.name in response['columns']]
+                sample = get_sample_frame(table_name, known, limit=profile_sample_rows, strategy="random") if known else pd.DataFrame()
+                hints, _ = classify_columns(sample)
+            escalated = []
+            for column in new_columns:
+                confidence[column.name], _ = column_confidence(column, hints.get(column.name))
+                if confidence[column.name] < threshold:
+                    escalated.append(column.name)
+            last = i == len(models) - 1
+            if self.column_store:
+                # only the columns this tier's metadata is kept for; escalated ones are described by the next tier.
+                tier_run_options = self._run_options(kwargs.get('context_mode', 'isolated'), kwargs.get('classifier_mode'))
+                signatures = response.get('column_signatures') or {}
+                for column in new_columns:
+                    if column.name in signatures and (last or column.name not in escalated):
+                        self.column_store.add(signatures[column.name], column, table_name, model_name, tier_run_options)
+            metrics = response['metrics']
+            tiers.append({
+                'model': model_name, 'columns': len(new_columns), 'escalated': [] if last else sorted(escalated),
+                'cached': response['cached'], 'llm_calls': metrics['llm_calls'], 'prompt_tokens': metrics['prompt_tokens'],
+                'completion_tokens': metrics['completion_tokens'], 'seconds': metrics['wall_seconds']
+            })
+            if last or not escalated:
+                break
+            seed = DatasetMetadata(name=metadata.name, description=metadata.description,
+                                   columns=[column for column in metadata.columns if column.name not in escalated])
+        classifier = None
+        if kwargs.get('classifier_mode'):
+            for entry in detector_stats.values():
+                entry['seconds'] = round(entry['seconds'], 6)
+            classifier = {'hints': classifier_hints, 'detectors': detector_precision(detector_stats, list(hint_checks.values()))}
+        if cache_key and response.get('metadata'):
+            self.cache.put(cache_key, table_name, cascade_name, response['metadata'])
+        yield {**response, 'classifier': classifier, 'cascade': {'confidence': confidence, 'tiers': tiers}}
+
+
+    def _run_options(self, context_mode: str, classifier_mode: Optional[str]) -> str:
+        """Identifies the prompt version and run options, which stored metadata must match to be reused."""
+        return f"{template_version}/{context_mode}/{classifier_mode}"
+
+
+    def _reuse_columns(self, input: Dict[str, Any], signatures: Dict[str, Dict[str, Any]], options: str) -> List[str]:
+        """
+        Seeds the input with stored metadata of similar columns from other tables, generated by the same model with
+        the same options, so they are left out of the LLM batches.
+
+        Args:
+            input (Dict[str, Any]): Input state of the run.
+            signatures (Dict[str, Dict[str, Any]]): Signature of every column not processed yet.
+            options (str): Prompt version and run options of the run.
+
+        Returns:
+            List[str]: The columns whose metadata was reused.
+        """
+        table_name = input['table_name']
+        processed_columns = set(input.get('processed_columns') or set())
+        reused = []
+        for name, signature in signatures.items():
+            column = self.column_store.find(signature, input['model_name'], options, exclude_table=table_name)
+            if column:
+                reused.append(column.copy(update={'name': name}))
+        if reused:
+            input['processed_columns'] = processed_columns | {column.name for column in reused}
+            input['metadata'] = self._merge_metadata([
+                input.get('metadata'), DatasetMetadata(name=table_name, description="", columns=reused)
+            ])
+        return [column.name for column in reused]
+
+
+    def _seed_from_latest(self, input: Dict[str, Any], options: str) -> Optional[Dict[str, List[str]]]:
+        """
+        Seeds the input with the table's most recent metadata from the same model and options, for the columns
+        whose name and type are unchanged.
+
+        Returns:
+            Optional[Dict[str, List[str]]]: 'added', 'retyped' and 'removed' columns and the number of 'reused'
+                ones, or None if the table has no metadata stored for this model and these options.
+        """
+        latest = self.cache.load_latest(input['table_name'], input['model_name'], options)
+        if not latest:
+            return None
+        previous, previous_types = latest
+        current_types = get_column_types(input['table_name'])
+        described = {column.name for column in previous.columns}
+        unchanged = {
+            name for name, data_type in current_types.items()
+            if name in described and previous_types.get(name) == data_type
+        }
+        input['processed_columns'] = unchanged
+        input['metadata'] = DatasetMetadata(
+            name=previous.name,
+            description=previous.description,
+            columns=[column for column in previous.columns if column.name in unchanged]
+        )
+        return {
+            'added': sorted(set(current_types) - set(previous_types)),
+            'retyped': sorted(name for name in current_types if name in previous_types and previous_types[name] != current_types[name]),
+            'removed': sorted(set(previous_types) - set(current_types)),
+            'reused': len(unchanged)
+        }
+
+
+    def _progress(self, metadata: Optional[DatasetMetadata], processed_columns: Set[str], columns: Set[str]) -> Dict[str, Any]:
+        return {'metadata': metadata, 'processed': len(processed_columns), 'total': len(columns), 'done': False}
+
+
+    def _stream_sequentially(self, input: Dict[str, Any]) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+        """Runs the workflow graph, yielding progress whenever a batch adds columns, and returns the final state."""
+        state = input
+        processed = 0
+        config = {'recursion_limit': self._recursion_limit(input)}
+        for state in self.wf.stream(input, stream_mode="values", config=config):
+            processed_columns = state.get('processed_columns') or set()
+            if state.get('metadata') and len(processed_columns) > processed:
+                processed = len(processed_columns)
+                yield self._progress(state['metadata'], processed_columns, state.get('columns') or processed_columns)
+        return {'token_usage': [], **state}
+
+
+    def _recursion_limit(self, input: Dict[str, Any]) -> int:
+        """
+        Bounds the graph steps of a sequential run, so that it stops if the model never completes the columns.
+
+        Every batch takes a model and a parse step, plus a tool and a model step per tool round. Bisecting
+        failed batches can shrink them to a single column, so there are at most as many batches as columns
+        left, plus one failed attempt per halving of the batch size.
+        """
+        columns = set(get_column_names(input['table_name'])) - set(input.get('processed_columns') or set())
+        steps_per_batch = 2 + 2 * max_tool_rounds
+        retries = max_columns_per_batch.bit_length()
+        return 10 + steps_per_batch * (len(columns) + retries)
+
+
+    def _stream_concurrently(self, input: Dict[str, Any], concurrency: int) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+        """
+        Splits all columns into batches up front and runs them through the batch graph in parallel,
+        yielding progress as each batch completes, and returns the final state.
+        """
+        state = {**input, **self._traced("init", self._init_state)(input)}
+        batches = self._column_batches(state)
+        metadata = state.get('metadata')
+        processed_columns = set(state['processed_columns'])
+        token_usage = []
+        hint_checks = []
+        retries = 0
+        missing_rounds = 0
+        batch_index = 0
+        while batches:
+            inputs = [{**state, 'next_column_batch': batch, 'batch_index': batch_index + i} for i, batch in enumerate(batches)]
+            batch_index += len(batches)
+            failed = []
+            for i, output in self.batch_wf.batch_as_completed(inputs, config={'max_concurrency': concurrency}, return_exceptions=True):
+                batch = batches[i]
+                if not isinstance(output, Exception):
+                    metadata = self._merge_metadata([metadata, output['metadata']])
+                    processed_columns.update(output['processed_columns'])
+                    token_usage.extend(output.get('token_usage') or [])
+                    hint_checks.extend(output.get('hint_checks') or [])
+                    yield self._progress(metadata, processed_columns, state['columns'])
+                elif isinstance(output, BatchParseError) and len(batch) > 1:
+                    # retry both halves of a batch whose response was truncated or could not be parsed.
+                    half = len(batch) // 2
+                    failed.extend([batch[:half], batch[half:]])
+                    with state['tracer'].span('split', batch_size=len(batch), retries=1):
+                        pass
+                else:
+                    raise output
+            retries += len(failed) // 2
+            batches = failed
+            missing = state['columns'] - processed_columns
+            if not batches and missing:
+                # the model answered but left some columns out; send them again in new batches.
+                if missing_rounds >= max_missing_column_rounds:
+                    raise ValueError(f"unable to generate metadata for the columns {sorted(missing)}")
+                missing_rounds += 1
+                batches = self._column_batches({**state, 'processed_columns': processed_columns})
+                with state['tracer'].span('requeue', batch_size=len(missing), retries=1):
+                    retries += 1
+        if metadata:
+            # batches complete in any order; keep the columns sorted like the batches.
+            metadata = DatasetMetadata(name=metadata.name, description=metadata.description,
+                                       columns=sorted(metadata.columns, key=lambda column: column.name))
+        return {**state, 'processed_columns': processed_columns, 'next_column_batch': [], 'metadata': metadata,
+                'batch_index': batch_index, 'retries': retries, 'token_usage': token_usage, 'hint_checks': hint_checks}
@@ -0,0 +1,113 @@
+import threading
+from typing import Callable, Dict, List, Any, Tuple, Optional
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_openai import ChatOpenAI
+from config import llm_client_defaults, llm_client_settings
+
+
+class PooledClient:
+    """Chat model with tools bound, shared by all callers and limited to a number of calls in flight."""
+
+    def __init__(self, model: Any, max_concurrency: int):
+        """
+        Initializes the client.
+
+        Args:
+            model (Any): Chat model runnable, with tools already bound.
+            max_concurrency (int): Maximum number of calls in flight at the same time.
+        """
+        self.model = model
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+
+    def invoke(self, messages: List[BaseMessage]) -> BaseMessage:
+        """Invokes the model, waiting for a free slot when `max_concurrency` calls are in flight."""
+        with self._semaphore:
+            return self.model.invoke(messages)
+
+
+class LLMClientRegistry:
+    """Process-wide registry of chat model clients, created once per model and reused for every call."""
+
+    def __init__(self, defaults: Dict[str, Any] = llm_client_defaults, settings: Dict[str, Dict[str, Any]] = llm_client_settings):
+        """
+        Initializes the registry.
+
+        Args:
+            defaults (Dict[str, Any]): Client settings used for every model: 'max_concurrency', 'timeout' in seconds
+                and 'max_retries'.
+            settings (Dict[str, Dict[str, Any]]): Settings overriding the defaults, per model name.
+        """
+        self.defaults = defaults
+        self.settings = settings
+        self._factories: Dict[str, Callable[[], BaseChatModel]] = {}
+        self._clients: Dict[Tuple[str, Tuple[str, ...]], PooledClient] = {}
+        self._lock = threading.Lock()
+
+
+    def model_settings(self, model_name: str) -> Dict[str, Any]:
+        """Returns the client settings of a model."""
+        return {**self.defaults, **self.settings.get(model_name, {})}
+
+
+    def register(self, model_name: str, factory: Callable[[], BaseChatModel]) -> None:
+        """
+        Registers a factory for a model, for example a local fake chat model in tests.
+
+        Args:
+            model_name (str): Name under which the model is requested.
+            factory (Callable[[], BaseChatModel]): Creates the chat model.
+        """
+        with self._lock:
+            self._factories[model_name] = factory
+            self._clients = {key: client for key, client in self._clients.items() if key[0] != model_name}
+
+
+    def _create_model(self, model_name: str) -> BaseChatModel:
+        factory = self._factories.get(model_name)
+        if factory:
+            return factory()
+        settings = self.model_settings(model_name)
+        # keep-alive connection pool sized to the calls allowed in flight. The OpenAI client retries
+        # 429 and 5xx responses and connection errors with exponential backoff, up to max_retries times.
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=settings['max_concurrency'], max_keepalive_connections=settings['max_concurrency']),
+            timeout=settings['timeout']
+        )
+        return ChatOpenAI(
+            model_name=model_name,
+            temperature=0,
+            timeout=settings['timeout'],
+            max_retries=settings['max_retries'],
+            http_client=http_client
+        )
+
+
+    def get(self, model_name: str, tools: Optional[List[Any]] = None) -> PooledClient:
+        """
+        Returns the shared client of a model with the tools bound, creating it on first use.
+
+        Args:
+            model_name (str): Name of the LLM model.
+            tools (Optional[List[Any]]): Tools bound to the model.
+
+        Returns:
+            PooledClient: Shared client.
+        """
+        tools = tools or []
+        key = (model_name, tuple(tool.name for tool in tools))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                model = self._create_model(model_name)
+                if tools:
+                    model = model.bind_tools(tools=tools)
+                client = PooledClient(model, self.model_settings(model_name)['max_concurrency'])
+                self._clients[key] = client
+            return client
+
+
+# registry - shared by all generators in the process.
+llm_clients = LLMClientRegistry()
@@ -1,8 +1,58 @@
+import uuid
 import streamlit as st
+import pandas as pd
 from typing import List
-from database import get_table_names, get_sample_data, get_column_names
+from database import get_table_names, get_sample_data, catalog
 from llm import MetadataGenerator
-from config import model_dict, color_map
+from cache import MetadataCache
+from checkpoint import CheckpointStore
+from column_store import ColumnStore
+from metadata_catalog import MetadataCatalog
+from rate_limit import rate_limiter
+from config import model_dict, color_map, batch_concurrency, ui_table_names_ttl, ui_sample_data_ttl, catalog_page_size
+
+
+@st.cache_resource
+def get_metadata_cache() -> MetadataCache:
+    """Returns the cache of generated metadata, shared by all sessions and reruns."""
+    return MetadataCache()
+
+
+@st.cache_resource
+def get_checkpoint_store() -> CheckpointStore:
+    """Returns the store of checkpoints of unfinished runs, shared by all sessions and reruns."""
+    return CheckpointStore()
+
+
+@st.cache_resource
+def get_column_store() -> ColumnStore:
+    """Returns the store of column metadata reused across tables, shared by all sessions and reruns."""
+    return ColumnStore()
+
+
+@st.cache_resource
+def get_metadata_catalog() -> MetadataCatalog:
+    """Returns the searchable catalog of generated metadata, shared by all sessions and reruns."""
+    return MetadataCatalog()
+
+
+@st.cache_resource
+def get_metadata_generator() -> MetadataGenerator:
+    """Returns the metadata generator with its compiled workflow graphs, shared by all sessions and reruns."""
+    return MetadataGenerator(cache=get_metadata_cache(), rate_limiter=rate_limiter, checkpoints=get_checkpoint_store(),
+                             column_store=get_column_store(), metadata_catalog=get_metadata_catalog())
+
+
+@st.cache_data(ttl=ui_table_names_ttl)
+def cached_table_names() -> List[str]:
+    """Returns the table names, reloaded at most every `ui_table_names_ttl` seconds."""
+    return get_table_names()
+
+
+@st.cache_data(ttl=ui_sample_data_ttl)
+def cached_sample_data(table_name: str) -> pd.DataFrame:
+    """Returns the sample data of a table, reloaded at most every `ui_sample_data_ttl` seconds."""
+    return pd.DataFrame(get_sample_data(table_name))
 
 
 def load_css(css_file_name):
@@ -17,12 +67,24 @@ def render_sidebar() -> str:
     Returns:
         tuple: A tuple containing the selected table and selected model.
     """
-    table_names = get_table_names()
     with st.sidebar:
         st.markdown("<div class='sidebar-content'>", unsafe_allow_html=True)
         st.header("Options")
+        if st.button("Refresh tables", key='refresh_tables_btn'):
+            catalog.invalidate()
+            cached_table_names.clear()
+            cached_sample_data.clear()
+        table_names = cached_table_names()
         selected_table = st.selectbox("Select a table", table_names)
-        selected_model = st.radio("LLM model:", ["GPT 3.5", "GPT 4", "GPT 4o"], index=1)
+        selected_model = st.radio("LLM model:", ["GPT 3.5", "GPT 4", "GPT 4o", "Cascade"], index=1,
+                                  help="Cascade describes all columns with the fastest model and only the uncertain ones with a stronger model")
+        metadata_cache = get_metadata_cache()
+        if st.button("Clear cached metadata", key='clear_cache_btn'):
+            metadata_cache.invalidate(selected_table)
+        stats = metadata_cache.stats()
+        st.caption(f"Metadata cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        column_stats = get_column_store().stats()
+        st.caption(f"Reused columns: {column_stats['hits']} of {column_stats['hits'] + column_stats['misses']} ({column_stats['hit_rate']:.0%})")
         st.markdown("</div>", unsafe_allow_html=True)
 
     return selected_table, selected_model
@@ -35,7 +97,9 @@ def display_sample_data(selected_table: str) -> None:
     Args:
         selected_table (str): The name of the selected table.
     """
-    sample_data = get_sample_data(selected_table)
+    if st.button("Refresh sample data", key='refresh_sample_btn'):
+        cached_sample_data.clear()
+    sample_data = cached_sample_data(selected_table)
     st.subheader(f"Sample Data from {selected_table}")
     st.dataframe(sample_data)
 
@@ -50,17 +114,67 @@ def handle_generate_metadata(selected_table: str, selected_model: str) -> None:
     """
     if "generated_metadata" not in st.session_state:
         st.session_state.generated_metadata = None
+    if "session_id" not in st.session_state:
+        # run ids are per session, so that sessions generating the same table do not share or delete checkpoints.
+        st.session_state.session_id = uuid.uuid4().hex
+    session_id = st.session_state.session_id
 
     st.markdown("<div class='generate-metadata-section'>", unsafe_allow_html=True)
+    incremental = st.checkbox("Only regenerate new or changed columns", value=True, key='incremental_chk')
+    classifier_mode = st.selectbox("Pattern detection", [None, "hint", "override"],
+                                   format_func=lambda mode: mode or "off", key='classifier_mode_select')
     if st.button("Generate Metadata", key='generate_metadata_btn'):
-        metadata_generator = MetadataGenerator()
-        columns = get_column_names(selected_table)
-        model_name = model_dict[selected_model]
-        response = metadata_generator.generate_metadata(table_name=selected_table, model_name=model_name)
-        st.session_state.generated_metadata = response['metadata']
+        metadata_generator = get_metadata_generator()
+        progress = st.progress(0.0, text="Generating metadata ...")
+        live = st.empty()
+        if selected_model == "Cascade":
+            events = metadata_generator.stream_cascade(table_name=selected_table, concurrency=batch_concurrency,
+                                                       run_id=f"{selected_table}:cascade:{session_id}", incremental=incremental,
+                                                       classifier_mode=classifier_mode)
+        else:
+            model_name = model_dict[selected_model]
+            events = metadata_generator.stream_metadata(table_name=selected_table, model_name=model_name,
+                                                        concurrency=batch_concurrency, run_id=f"{selected_table}:{model_name}:{session_id}",
+                                                        incremental=incremental, classifier_mode=classifier_mode)
+        for event in events:
+            st.session_state.generated_metadata = event['metadata']
+            progress.progress(event['processed'] / max(event['total'], 1), text=f"{event['processed']} of {event['total']} columns")
+            if not event['done']:
+                # show each batch as it arrives, without widgets: interacting with one would rerun the script
+                # and stop the generation. The final result is displayed by display_generated_metadata.
+                with live.container():
+                    display_metadata_progress(event['metadata'])
+                continue
+            if event.get('classifier'):
+                st.caption(f"Pattern detection hinted {len(event['classifier']['hints'])} columns")
+                st.dataframe(pd.DataFrame(event['classifier']['detectors']).T)
+            if event.get('cascade'):
+                st.caption("Cascade tiers")
+                tiers = pd.DataFrame(event['cascade']['tiers'])
+                tiers['escalated'] = tiers['escalated'].map(len)
+                st.dataframe(tiers)
+        live.empty()
+        progress.empty()
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+def display_metadata_progress(metadata) -> None:
+    """
+    Displays the columns described so far as a read-only table.
+
+    Args:
+        metadata (DatasetMetadata): Metadata merged so far.
+    """
+    if not metadata:
+        return
+    rows = [
+        {"column": column.name, "data type": column.data_type, "sensitivity": column.sensitivity,
+         "tags": ", ".join(column.tags or []), "definition": column.description}
+        for column in metadata.columns
+    ]
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
 def display_generated_metadata() -> None:
     """
     Displays the generated metadata for the selected column.
@@ -93,6 +207,32 @@ def display_generated_metadata() -> None:
         st.markdown("</div>", unsafe_allow_html=True)
             
 
+def render_catalog_search() -> None:
+    """
+    Renders the search page of the metadata catalog, with filters and paginated results.
+    """
+    metadata_catalog = get_metadata_catalog()
+    stats = metadata_catalog.stats()
+    st.subheader("Search Metadata Catalog")
+    st.caption(f"{stats['columns']} columns in {stats['tables']} tables")
+    filters = st.columns(4)
+    tags = filters[0].multiselect("Tags", list(color_map), key='search_tags')
+    sensitivity = filters[1].selectbox("Sensitivity", ["", "PII", "PHI", "not sensitive"], key='search_sensitivity')
+    data_type = filters[2].text_input("Data type", key='search_data_type')
+    query = filters[3].text_input("Description contains", key='search_query')
+    page = st.number_input("Page", min_value=1, value=1, step=1, key='search_page')
+
+    columns, total = metadata_catalog.search_columns(tags=tags, sensitivity=sensitivity or None, data_type=data_type or None,
+                                                     query=query or None, limit=catalog_page_size,
+                                                     offset=(page - 1) * catalog_page_size)
+    pages = max(1, -(-total // catalog_page_size))
+    st.caption(f"{total} matching columns, page {page} of {pages}")
+    if columns:
+        results = pd.DataFrame(columns)
+        results['tags'] = results['tags'].map(", ".join)
+        st.dataframe(results, use_container_width=True)
+
+
 def main() -> None:
     """
     The main function that sets up the Streamlit app and orchestrates the flow.
@@ -102,10 +242,14 @@ def main() -> None:
     load_css("styles.css")
     st.markdown("<div class='header'>Table Metadata Generator</div>", unsafe_allow_html=True)
 
-    selected_table, selected_model = render_sidebar()
-    display_sample_data(selected_table)
-    handle_generate_metadata(selected_table, selected_model)
-    display_generated_metadata()
+    page = st.sidebar.radio("Page:", ["Generate", "Search catalog"], key='page_radio')
+    if page == "Search catalog":
+        render_catalog_search()
+    else:
+        selected_table, selected_model = render_sidebar()
+        display_sample_data(selected_table)
+        handle_generate_metadata(selected_table, selected_model)
+        display_generated_metadata()
     st.markdown("<div class='footer'>© 2024 Table Metadata Generator. All rights reserved.</div>", unsafe_allow_html=True)
 
 
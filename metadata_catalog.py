@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+import threading
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from metadata import DatasetMetadata
+from database import engine as default_engine
+from config import catalog_page_size
+
+
+class MetadataCatalog:
+    """
+    Searchable catalog of the generated metadata of all tables, stored in the application database.
+
+    On Postgres, column tags are a text array with a GIN index, sensitivity and data type have btree indexes
+    and descriptions a full-text GIN index, and columns are written with COPY. Other databases, such as the
+    SQLite file of the benchmark, store tags as JSON text and search with LIKE.
+    """
+
+    postgres_ddl = [
+        """
+        CREATE TABLE IF NOT EXISTS metadata_datasets (
+            table_name TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS metadata_columns (
+            table_name TEXT NOT NULL REFERENCES metadata_datasets (table_name) ON DELETE CASCADE,
+            column_name TEXT NOT NULL,
+            data_type TEXT NOT NULL,
+            description TEXT NOT NULL,
+            tags TEXT[] NOT NULL DEFAULT '{}',
+            sensitivity TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            PRIMARY KEY (table_name, column_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS metadata_columns_tags ON metadata_columns USING GIN (tags)",
+        "CREATE INDEX IF NOT EXISTS metadata_columns_sensitivity ON metadata_columns (lower(sensitivity))",
+        "CREATE INDEX IF NOT EXISTS metadata_columns_data_type ON metadata_columns (lower(data_type))",
+        "CREATE INDEX IF NOT EXISTS metadata_columns_description ON metadata_columns USING GIN (to_tsvector('english', description))",
+    ]
+
+    generic_ddl = [
+        """
+        CREATE TABLE IF NOT EXISTS metadata_datasets (
+            table_name TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS metadata_columns (
+            table_name TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            data_type TEXT NOT NULL,
+            description TEXT NOT NULL,
+            tags TEXT NOT NULL DEFAULT '[]',
+            sensitivity TEXT NOT NULL,
+            analysis TEXT NOT NULL,
+            PRIMARY KEY (table_name, column_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS metadata_columns_sensitivity ON metadata_columns (sensitivity)",
+        "CREATE INDEX IF NOT EXISTS metadata_columns_data_type ON metadata_columns (data_type)",
+    ]
+
+    def __init__(self, engine: Engine = default_engine):
+        """
+        Initializes the catalog, creating its tables and indexes if needed.
+
+        Args:
+            engine (Engine): SQLAlchemy engine of the database.
+        """
+        self.engine = engine
+        self.postgres = engine.dialect.name == 'postgresql'
+        self._lock = threading.Lock()
+        with self.engine.connect() as conn:
+            for ddl in (self.postgres_ddl if self.postgres else self.generic_ddl):
+                conn.execute(text(ddl))
+            conn.commit()
+
+
+    def save(self, table_name: str, model_name: str, metadata: DatasetMetadata) -> None:
+        """Replaces the catalog entry of a table with its generated metadata."""
+        self.save_many([(table_name, model_name, metadata)])
+
+
+    def save_many(self, items: List[Tuple[str, str, DatasetMetadata]]) -> None:
+        """
+        Replaces the catalog entries of several tables in one transaction.
+
+        Args:
+            items (List[Tuple[str, str, DatasetMetadata]]): Table name, model name and metadata of every table.
+        """
+        if not items:
+            return
+        datasets = [
+            {"table_name": table_name, "name": metadata.name, "description": metadata.description or "", "model_name": model_name}
+            for table_name, model_name, metadata in items
+        ]
+        columns = [
+            (table_name, column.name, column.data_type or "", column.description or "", list(column.tags or []),
+             column.sensitivity or "", column.analysis or "")
+            for table_name, _, metadata in items
+            for column in metadata.columns
+        ]
+        with self._lock:
+            if self.postgres:
+                self._save_postgres(datasets, columns)
+            else:
+                self._save_generic(datasets, columns)
+
+
+    def _save_postgres(self, datasets: List[Dict[str, Any]], columns: List[tuple]) -> None:
+        """Upserts the datasets and writes all their columns with a single COPY."""
+        buffer = io.StringIO()
+        # quote every field: COPY reads an unquoted empty field as NULL.
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for table_name, column_name, data_type, description, tags, sensitivity, analysis in columns:
+            writer.writerow([table_name, column_name, data_type, description, self._array_literal(tags), sensitivity, analysis])
+        buffer.seek(0)
+
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """
+                INSERT INTO metadata_datasets (table_name, name, description, model_name, updated_at)
+                VALUES (%(table_name)s, %(name)s, %(description)s, %(model_name)s, now())
+                ON CONFLICT (table_name) DO UPDATE SET
+                    name = EXCLUDED.name, description = EXCLUDED.description,
+                    model_name = EXCLUDED.model_name, updated_at = EXCLUDED.updated_at
+                """,
+                datasets
+            )
+            cursor.execute("DELETE FROM metadata_columns WHERE table_name = ANY(%s)", ([dataset["table_name"] for dataset in datasets],))
+            cursor.copy_expert(
+                "COPY metadata_columns (table_name, column_name, data_type, description, tags, sensitivity, analysis) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+
+    def _save_generic(self, datasets: List[Dict[str, Any]], columns: List[tuple]) -> None:
+        """Replaces the datasets and their columns with batched inserts."""
+        with self.engine.begin() as conn:
+            for dataset in datasets:
+                conn.execute(text("DELETE FROM metadata_columns WHERE table_name = :table_name"), dataset)
+                conn.execute(text("DELETE FROM metadata_datasets WHERE table_name = :table_name"), dataset)
+            conn.execute(
+                text("INSERT INTO metadata_datasets (table_name, name, description, model_name) "
+                     "VALUES (:table_name, :name, :description, :model_name)"),
+                datasets
+            )
+            if columns:
+                conn.execute(
+                    text("INSERT INTO metadata_columns (table_name, column_name, data_type, description, tags, sensitivity, analysis) "
+                         "VALUES (:table_name, :column_name, :data_type, :description, :tags, :sensitivity, :analysis)"),
+                    [
+                        {"table_name": row[0], "column_name": row[1], "data_type": row[2], "description": row[3],
+                         "tags": json.dumps(row[4]), "sensitivity": row[5], "analysis": row[6]}
+                        for row in columns
+                    ]
+                )
+
+
+    def _array_literal(self, values: List[str]) -> str:
+        """Formats a list of strings as a Postgres text array literal for COPY."""
+        escaped = ('"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"' for value in values)
+        return "{" + ",".join(escaped) + "}"
+
+
+    def delete(self, table_name: str) -> None:
+        """Removes a table and its columns from the catalog."""
+        with self._lock, self.engine.begin() as conn:
+            conn.execute(text("DELETE FROM metadata_columns WHERE table_name = :table_name"), {"table_name": table_name})
+            conn.execute(text("DELETE FROM metadata_datasets WHERE table_name = :table_name"), {"table_name": table_name})
+
+
+    def search_columns(self, tags: Optional[List[str]] = None, sensitivity: Optional[str] = None,
+                       data_type: Optional[str] = None, query: Optional[str] = None, table_name: Optional[str] = None,
+                       limit: int = catalog_page_size, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Finds catalog columns matching all the given filters.
+
+        Args:
+            tags (Optional[List[str]]): Columns must have all these tags.
+            sensitivity (Optional[str]): Sensitivity, such as 'PII' or 'PHI'; case-insensitive.
+            data_type (Optional[str]): Data type; case-insensitive.
+            query (Optional[str]): Words to find in the column description - full-text search on Postgres.
+            table_name (Optional[str]): Only columns of this table.
+            limit (int): Maximum number of columns returned.
+            offset (int): Number of matching columns skipped, for pagination.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int]: The page of matching columns, ordered by table and column name,
+                and the total number of matching columns.
+        """
+        conditions = []
+        params: Dict[str, Any] = {"limit": limit, "offset": offset}
+        if tags:
+            if self.postgres:
+                conditions.append("tags @> CAST(:tags AS TEXT[])")
+                params["tags"] = list(tags)
+            else:
+                for i, tag in enumerate(tags):
+                    conditions.append(f"tags LIKE :tag_{i}")
+                    params[f"tag_{i}"] = f'%{json.dumps(tag)}%'
+        if sensitivity:
+            conditions.append("lower(sensitivity) = lower(:sensitivity)")
+            params["sensitivity"] = sensitivity
+        if data_type:
+            conditions.append("lower(data_type) = lower(:data_type)")
+            params["data_type"] = data_type
+        if query:
+            if self.postgres:
+                conditions.append("to_tsvector('english', description) @@ plainto_tsquery('english', :query)")
+                params["query"] = query
+            else:
+                conditions.append("lower(description) LIKE lower(:query)")
+                params["query"] = f"%{query}%"
+        if table_name:
+            conditions.append("table_name = :table_name")
+            params["table_name"] = table_name
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        statement = text(f"""
+            SELECT table_name, column_name, data_type, description, tags, sensitivity, analysis, count(*) OVER () AS total
+            FROM metadata_columns
+            {where}
+            ORDER BY table_name, column_name
+            LIMIT :limit OFFSET :offset
+        """)
+        with self.engine.connect() as conn:
+            rows = conn.execute(statement, params).mappings().fetchall()
+        if not rows:
+            return [], self._count(where, params) if offset else 0
+        columns = []
+        for row in rows:
+            column = dict(row)
+            total = column.pop("total")
+            if not self.postgres:
+                column["tags"] = json.loads(column["tags"])
+            columns.append(column)
+        return columns, total
+
+
+    def _count(self, where: str, params: Dict[str, Any]) -> int:
+        """Counts the matching columns, for a page past the last match."""
+        with self.engine.connect() as conn:
+            return conn.execute(text(f"SELECT count(*) FROM metadata_columns {where}"), params).scalar()
+
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of tables and columns in the catalog."""
+        with self.engine.connect() as conn:
+            tables = conn.execute(text("SELECT count(*) FROM metadata_datasets")).scalar()
+            columns = conn.execute(text("SELECT count(*) FROM metadata_columns")).scalar()
+        return {"tables": tables, "columns": columns}
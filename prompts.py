@@ -1,11 +1,29 @@
 from langchain.prompts import ChatPromptTemplate
 from textwrap import dedent
 
+# Bump whenever a template changes so that cached metadata generated with an older prompt is not reused.
+template_version = "5"
+
 template = ChatPromptTemplate.from_messages(
     messages=[
         ("system", "you are an expert in analyzing data, generate meaningful definitions, categorize, apply tags and determine sensitivity of data. You always pay attention to the output format."),
-        ("human", dedent("""Get sample data from this table: {table_name}. Analyze the sample data for the columns: {next_column_batch} and generate output strictly following these instructions: {format_instructions}
+        ("human", dedent("""Get sample data for the columns {next_column_batch} from this table: {table_name}. Analyze the sample data for the columns: {next_column_batch}
+         {column_hints}Generate output strictly following these instructions: {format_instructions}
+         This is very IMPORTANT: Your output should NOT contain anything other than json formatted to the provided instructions.
+         """))
+    ]
+)
+
+# Used when each column batch is sent without the conversation of earlier batches: the sample data
+# is fetched once per table and every batch prompt includes the sample of its own columns, so no tool call is needed.
+batch_template = ChatPromptTemplate.from_messages(
+    messages=[
+        ("system", "you are an expert in analyzing data, generate meaningful definitions, categorize, apply tags and determine sensitivity of data. You always pay attention to the output format."),
+        ("human", dedent("""Here is sample data from this table: {table_name}
+         {table_summary}
+         Analyze the sample data for the columns: {next_column_batch}
+         {column_hints}Generate output strictly following these instructions: {format_instructions}
          This is very IMPORTANT: Your output should NOT contain anything other than json formatted to the provided instructions.
          """))
     ]
-)
\ No newline at end of file
+)
@@ -0,0 +1,94 @@
+import threading
+import time
+from typing import Dict
+from config import model_rate_limits
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.available = per_minute
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+
+    def refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available."""
+        missing = min(amount, self.capacity) - self.available
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    """Request and token rate limiter shared by all LLM calls, with separate budgets per model."""
+
+    def __init__(self, limits: Dict[str, Dict[str, float]] = model_rate_limits):
+        """
+        Initializes the rate limiter.
+
+        Args:
+            limits (Dict[str, Dict[str, float]]): Limits per model name, with 'requests_per_minute' and
+                'tokens_per_minute'. Calls to models without limits are not throttled.
+        """
+        self._buckets = {
+            model_name: (_Bucket(limit['requests_per_minute']), _Bucket(limit['tokens_per_minute']))
+            for model_name, limit in limits.items()
+        }
+        self._lock = threading.Lock()
+
+
+    def acquire(self, model_name: str, tokens: int = 0) -> float:
+        """
+        Blocks until a request using about `tokens` tokens is allowed for the model.
+
+        Args:
+            model_name (str): Name of the LLM model.
+            tokens (int): Estimated number of tokens of the request.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        buckets = self._buckets.get(model_name)
+        if not buckets:
+            return 0.0
+        requests, token_budget = buckets
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                requests.refill(now)
+                token_budget.refill(now)
+                wait = max(requests.wait_time(1), token_budget.wait_time(tokens))
+                if wait == 0:
+                    requests.available -= 1
+                    token_budget.available -= tokens
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+
+    def record(self, model_name: str, tokens: int) -> None:
+        """
+        Charges tokens that were used on top of the estimate passed to acquire.
+
+        Args:
+            model_name (str): Name of the LLM model.
+            tokens (int): Additional tokens; negative values give back an overestimate.
+        """
+        buckets = self._buckets.get(model_name)
+        if not buckets:
+            return
+        with self._lock:
+            token_budget = buckets[1]
+            token_budget.refill(time.monotonic())
+            token_budget.available = min(token_budget.capacity, token_budget.available - tokens)
+
+
+# rate limiter - shared by all generators in the process.
+rate_limiter = RateLimiter()
@@ -1,18 +1,74 @@
-import pandas as pd
+import json
+import threading
+from concurrent.futures import Future
 from langchain.tools import tool
-from typing import Optional, List
-from database import get_sample_data as func_get_sample_data
+from typing import Optional, List, Dict, Any, Callable
+from database import get_sample_frame, format_sample_frame
+from config import sample_rows, sample_strategy, sample_max_value_length
 
 @tool
-def get_sample_data(table_name: str) -> Optional[str]:
+def get_sample_data(table_name: str, columns: Optional[List[str]] = None) -> str:
     """
     Get sample data for a given table.
 
     Args:
         table_name (str): Name of the table.
+        columns (Optional[List[str]]): Columns to include - pass the columns being analyzed. Defaults to all columns.
 
     Returns:
-        Optional[str]: Sample data in CSV format, or None if an error occurs.
+        str: Sample rows in CSV format, or the sample values of each column for the 'distinct' strategy.
+            An error message, such as for a misspelled column, so that the call can be corrected.
     """
-    df = pd.DataFrame(func_get_sample_data(table_name))
-    return df.head(3).to_csv(index=False, header=True)
+    try:
+        df = get_sample_frame(table_name, columns, limit=sample_rows, strategy=sample_strategy, max_value_length=sample_max_value_length)
+    except ValueError as e:
+        return f"Error: {e}"
+    return format_sample_frame(df, sample_strategy)
+
+
+class ToolCallCache:
+    """Results of the tool calls of one generation run, so that identical calls are executed only once."""
+
+    def __init__(self):
+        self._results: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get_or_call(self, name: str, args: Dict[str, Any], call: Callable[[], Any]) -> Any:
+        """
+        Returns the result of an earlier call with the same tool name and arguments, or makes the call.
+
+        Concurrent identical calls wait for the first one instead of executing again. Failed calls are not kept.
+
+        Args:
+            name (str): Name of the tool.
+            args (Dict[str, Any]): Arguments of the call.
+            call (Callable[[], Any]): Executes the call.
+
+        Returns:
+            Any: Result of the call.
+        """
+        key = json.dumps([name, args], sort_keys=True, default=str)
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = self._results[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(call())
+            except Exception as e:
+                with self._lock:
+                    del self._results[key]
+                future.set_exception(e)
+        return future.result()
+
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of calls served from the cache and executed."""
+        return {"hits": self.hits, "misses": self.misses}
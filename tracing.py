@@ -0,0 +1,78 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Iterator
+
+logger = logging.getLogger("metadata_assistant")
+
+
+class Tracer:
+    """Records timed spans of a metadata generation run, logs each one as a JSON record and summarizes them."""
+
+    def __init__(self, **context: Any):
+        """
+        Initializes the tracer.
+
+        Args:
+            **context (Any): Fields added to every log record, such as the table and model name.
+        """
+        self.context = context
+        self.spans: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Times a block of work.
+
+        Args:
+            name (str): Name of the span, such as the graph node.
+            **attributes (Any): Initial attributes of the span.
+
+        Yields:
+            Dict[str, Any]: Attributes of the span; the block can add to them, for example token counts.
+        """
+        record = {'span': name, **attributes}
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            with self._lock:
+                self.spans.append(record)
+            logger.info(json.dumps({**self.context, **record}, default=str))
+
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarizes the spans recorded so far.
+
+        Returns:
+            Dict[str, Any]: Wall time of the run, count and time of each span name, and totals of LLM calls,
+                prompt and completion tokens, tool calls, retries and batches.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        nodes: Dict[str, Dict[str, float]] = {}
+        for record in spans:
+            node = nodes.setdefault(record['span'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            node['count'] += 1
+            node['seconds'] = round(node['seconds'] + record['seconds'], 4)
+            node['max_seconds'] = max(node['max_seconds'], record['seconds'])
+        return {
+            'wall_seconds': round(time.perf_counter() - self.started, 4),
+            'nodes': nodes,
+            'llm_calls': nodes.get('model', {}).get('count', 0),
+            'prompt_tokens': sum(record.get('prompt_tokens', 0) for record in spans),
+            'completion_tokens': sum(record.get('completion_tokens', 0) for record in spans),
+            'tool_calls': sum(record.get('tool_calls', 0) for record in spans),
+            'retries': sum(record.get('retries', 0) for record in spans),
+            'batches': sum(1 for record in spans if record['span'] == 'parse' and 'error' not in record and not record.get('retries')),
+        }